@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,10 +51,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'gatepass.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gatepass.principal.PrincipalMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'gatepass.middleware.GatepassExpiryMiddleware',
@@ -89,11 +92,115 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Configured from the environment. GATEPASS_DB_ENGINE=sqlite (default) suits a
+# single small site; GATEPASS_DB_ENGINE=postgres (needs psycopg) is for
+# anything with several gates or app servers. For SQLite under concurrent
+# scans, switch the file to WAL once with `manage.py sqlite_journal_mode wal`
+# and set GATEPASS_DB_SQLITE_WAL=1.
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _database():
+    engine = os.environ.get('GATEPASS_DB_ENGINE', 'sqlite').lower()
+    if engine == 'sqlite':
+        options = {
+            # Seconds a writer waits for the lock before "database is locked"
+            'timeout': _env_int('GATEPASS_DB_SQLITE_TIMEOUT', 20),
+            # Take the write lock at BEGIN so transactions queue on the busy timeout
+            # instead of failing when a read lock can't be upgraded
+            'transaction_mode': 'IMMEDIATE',
+        }
+        if _env_bool('GATEPASS_DB_SQLITE_WAL', False):
+            # Only set this once the file is in WAL mode (`manage.py sqlite_journal_mode wal`,
+            # which persists in the file); NORMAL sync is safe with WAL but not without it
+            options['init_command'] = 'PRAGMA synchronous=NORMAL;'
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('GATEPASS_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': options,
+        }
+
+    if engine in ('postgres', 'postgresql'):
+        pool = _env_bool('GATEPASS_DB_POOL', False)
+        options = {}
+        if pool:
+            # psycopg connection pool (Django 5.1+); replaces persistent connections
+            options['pool'] = {
+                'min_size': _env_int('GATEPASS_DB_POOL_MIN_SIZE', 2),
+                'max_size': _env_int('GATEPASS_DB_POOL_MAX_SIZE', 10),
+                'timeout': _env_int('GATEPASS_DB_POOL_TIMEOUT', 10),
+            }
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('GATEPASS_DB_NAME', 'gatepass'),
+            'USER': os.environ.get('GATEPASS_DB_USER', 'gatepass'),
+            'PASSWORD': os.environ.get('GATEPASS_DB_PASSWORD', ''),
+            'HOST': os.environ.get('GATEPASS_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('GATEPASS_DB_PORT', '5432'),
+            # Pooling and persistent connections are mutually exclusive
+            'CONN_MAX_AGE': 0 if pool else _env_int('GATEPASS_DB_CONN_MAX_AGE', 60),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': options,
+        }
+
+    raise ValueError(f"Unsupported GATEPASS_DB_ENGINE: {engine}")
+
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': _database(),
+}
+
+
+# Cache
+
+# Principals, scan cards, dashboard counters, inbox counts and template
+# fragments are invalidated by deleting cache keys, so every worker process
+# must share one cache. GATEPASS_CACHE_URL=redis://... (needs redis-py) is for
+# several app servers; the default file cache is shared by the workers of one
+# host. Per-process locmem is only used for tests: `manage.py test` switches to
+# it (gatepass.testing.TestRunner); other runners set GATEPASS_TESTING=1.
+TESTING = _env_bool('GATEPASS_TESTING', False)
+TEST_RUNNER = 'gatepass.testing.TestRunner'
+
+
+def _cache():
+    url = os.environ.get('GATEPASS_CACHE_URL')
+    if url:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': url,
+        }
+    default = 'locmem' if _env_bool('GATEPASS_TESTING', False) else 'file'
+    backend = os.environ.get('GATEPASS_CACHE_BACKEND', default).lower()
+    if backend == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('GATEPASS_CACHE_DIR', BASE_DIR / '.django_cache'),
+            'OPTIONS': {'MAX_ENTRIES': _env_int('GATEPASS_CACHE_MAX_ENTRIES', 10000)},
+        }
+    if backend == 'db':
+        # Shared across hosts without Redis; run `manage.py createcachetable` first
+        return {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'gatepass_cache',
+            'OPTIONS': {'MAX_ENTRIES': _env_int('GATEPASS_CACHE_MAX_ENTRIES', 10000)},
+        }
+    if backend == 'locmem':
+        return {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': _env_int('GATEPASS_CACHE_MAX_ENTRIES', 10000)},
+        }
+    raise ValueError(f"Unsupported GATEPASS_CACHE_BACKEND: {backend}")
+
+
+CACHES = {
+    'default': _cache(),
 }
 
 
@@ -148,6 +255,43 @@ DEFAULT_FROM_EMAIL = 'noreply@gatepass.com'
 # This will print emails to the console where you run `manage.py runserver`
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Approval emails are queued in the outbox table. When enabled, a background
+# thread delivers them right after commit; otherwise run `manage.py dispatch_outbox`.
+GATEPASS_OUTBOX_DISPATCH_IN_PROCESS = True
+GATEPASS_OUTBOX_MAX_ATTEMPTS = 5
+GATEPASS_OUTBOX_RETRY_BASE_SECONDS = 30
+
+# Dashboard counters are cached for at most this long (and dropped on any gatepass change)
+GATEPASS_STATS_TTL_SECONDS = 10
+
+# Security scan cards are cached per gatepass and rebuilt whenever it changes.
+# The TTL only bounds how long a card can outlive a missed invalidation.
+GATEPASS_SCAN_CARD_TTL_SECONDS = 60 * 15
+
+# The staff dashboards' live feed streams only when served through backend.asgi
+# (uvicorn, daphne, gunicorn with an ASGI worker). Under WSGI, live/events/
+# answers each request with what is new and the browser polls again after this.
+GATEPASS_LIVE_POLL_RETRY_SECONDS = 30
+
+# Requests slower than this are logged with their slowest SQL statements
+GATEPASS_SLOW_REQUEST_MS = 500
+# /metrics needs a staff login or `Authorization: Bearer <GATEPASS_METRICS_TOKEN>`
+# (unset disables token access). Addresses listed here may scrape without either,
+# but they are matched against REMOTE_ADDR, which behind a reverse proxy on the
+# same host is the proxy itself: only list them if the proxy blocks /metrics.
+GATEPASS_METRICS_TOKEN = os.environ.get('GATEPASS_METRICS_TOKEN', '')
+GATEPASS_METRICS_ALLOWED_IPS = []
+
+# Used or expired approval tokens older than this move to the token archive
+GATEPASS_TOKEN_RETENTION_DAYS = 7
+# Closed gatepasses older than this move to the gatepass archive
+GATEPASS_ARCHIVE_AFTER_DAYS = 180
+
+SIMPLE_JWT = {
+    # Access tokens carry the user's role and student/parent ids
+    'TOKEN_OBTAIN_SERIALIZER': 'gatepass.principal.PrincipalTokenObtainPairSerializer',
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from gatepass.metrics import metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -8,6 +9,7 @@ from rest_framework_simplejwt.views import (
 urlpatterns = [
     path('', include('gatepass.urls')),  # Make gatepass app handle root URLs
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('api/', include('gatepass.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
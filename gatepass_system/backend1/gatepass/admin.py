@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Parent, Gatepass, Profile, ApprovalToken
+from .models import Student, Parent, Gatepass, Profile, ApprovalToken, OutboundEmail, StudentOccupancy, GatepassEvent, ParentInbox, ApprovalTokenArchive, GatepassArchive
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -32,5 +32,69 @@ class ApprovalTokenAdmin(admin.ModelAdmin):
     list_display = ('token', 'gatepass', 'parent', 'created_at', 'expires_at', 'used', 'action_taken')
     list_filter = ('used', 'action_taken')
     search_fields = ('gatepass__student__roll_no', 'parent__name')
+    list_select_related = ('gatepass__student__profile__user', 'parent')
+    raw_id_fields = ('gatepass', 'parent')
+    # Skip the unfiltered COUNT(*) on every changelist page
+    show_full_result_count = False
+
+@admin.register(GatepassArchive)
+class GatepassArchiveAdmin(admin.ModelAdmin):
+    list_display = ('student', 'destination', 'status', 'from_time', 'to_time', 'created_at', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('student__roll_no',)
+    list_select_related = ('student__profile__user',)
+    show_full_result_count = False
+
+    # Archived gatepasses are read-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ApprovalTokenArchive)
+class ApprovalTokenArchiveAdmin(admin.ModelAdmin):
+    list_display = ('token', 'student_roll_no', 'parent_name', 'created_at', 'expires_at', 'used', 'action_taken')
+    list_filter = ('used', 'action_taken')
+    search_fields = ('student_roll_no', 'parent_name')
+    show_full_result_count = False
+
+    # Archived tokens are read-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to',)
+
+@admin.register(ParentInbox)
+class ParentInboxAdmin(admin.ModelAdmin):
+    list_display = ('parent', 'gatepass', 'expires_at')
+    search_fields = ('parent__name', 'gatepass__student__roll_no')
+    raw_id_fields = ('parent', 'gatepass')
+
+@admin.register(StudentOccupancy)
+class StudentOccupancyAdmin(admin.ModelAdmin):
+    list_display = ('student', 'gatepass', 'exited_at')
+    search_fields = ('student__roll_no',)
+
+@admin.register(GatepassEvent)
+class GatepassEventAdmin(admin.ModelAdmin):
+    list_display = ('gatepass', 'action', 'old_status', 'new_status', 'actor', 'created_at')
+    list_filter = ('action',)
+    search_fields = ('gatepass__student__roll_no', 'actor')
+    raw_id_fields = ('gatepass',)
+
+    # The history is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 admin.site.register(Profile)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GatepassConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gatepass'
+
+    def ready(self):
+        # Connect the signal receivers
+        from . import inbox, live, principal, recent, scan, signals, stats  # noqa: F401
@@ -0,0 +1,119 @@
+"""
+Hot/cold split of gatepasses. Closed gatepasses older than the retention
+window move to GatepassArchive (their events inlined, their approval tokens
+to the token archive), so the live table and its indexes only hold the
+current term. Reads that must see everything go through querysets(),
+page(), attach_tokens(), locate() and history_ndjson() here.
+"""
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import history, recent, tokens
+from .models import ApprovalToken, ApprovalTokenArchive, Gatepass, GatepassArchive, GatepassEvent
+from .pagination import keyset_merge
+from .signals import notify_changed
+
+RETENTION_DAYS = getattr(settings, 'GATEPASS_ARCHIVE_AFTER_DAYS', 180)
+BATCH_SIZE = 500
+
+FIELDS = (
+    'id', 'student_id', 'purpose', 'destination', 'from_time', 'to_time', 'status', 'created_at',
+    'request_expires_at', 'actual_exit_time', 'actual_entry_time',
+)
+EVENT_FIELDS = ('id', 'action', 'old_status', 'new_status', 'actor', 'data', 'created_at')
+
+
+def closed(cutoff):
+    """Gatepasses created before `cutoff` that can no longer change."""
+    return Gatepass.objects.filter(created_at__lt=cutoff).filter(
+        Q(status__in=['REJECTED', 'EXPIRED'])
+        | Q(status='APPROVED', actual_entry_time__isnull=False)
+        # Approved but never used, and its window is long over
+        | Q(status='APPROVED', actual_exit_time__isnull=True, to_time__lt=cutoff)
+    )
+
+
+def archive_batch(cutoff, batch_size=BATCH_SIZE):
+    """Move up to `batch_size` closed gatepasses, oldest first. Returns the number moved."""
+    with transaction.atomic():
+        rows = list(closed(cutoff).select_for_update().order_by('created_at').values(*FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+
+        events = defaultdict(list)
+        for event in (
+            GatepassEvent.objects.filter(gatepass_id__in=ids)
+            .order_by('created_at', 'id')
+            .values('gatepass_id', *EVENT_FIELDS)
+        ):
+            events[event.pop('gatepass_id')].append(event)
+
+        GatepassArchive.objects.bulk_create([GatepassArchive(events=events[row['id']], **row) for row in rows])
+        tokens.archive(ApprovalToken.objects.filter(gatepass_id__in=ids))
+        # Cascades to the events just copied
+        Gatepass.objects.filter(pk__in=ids).delete()
+
+        student_ids = {row['student_id'] for row in rows}
+        transaction.on_commit(lambda: recent.invalidate(student_ids))
+        notify_changed(ids)
+    return len(rows)
+
+
+def archive_closed(days=None, batch_size=BATCH_SIZE, now=None):
+    """Archive every gatepass closed more than `days` ago, in batches. Returns the total moved."""
+    cutoff = (now or timezone.now()) - timezone.timedelta(days=RETENTION_DAYS if days is None else days)
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def querysets(**filters):
+    """The live and archived gatepasses matching `filters`, which must use fields both tables share."""
+    return [Gatepass.objects.filter(**filters), GatepassArchive.objects.filter(**filters)]
+
+
+def page(cursor=None, page_size=50, **filters):
+    """keyset_page() across live and archived gatepasses. Rows have `is_archived` set."""
+    return keyset_merge(
+        [queryset.select_related('student__profile__user') for queryset in querysets(**filters)],
+        cursor,
+        page_size,
+    )
+
+
+def attach_tokens(rows):
+    """Set `archived_tokens` on the archived gatepasses among `rows`, in one query."""
+    archived = {row.pk: row for row in rows if row.is_archived}
+    if not archived:
+        return
+    for row in archived.values():
+        row.archived_tokens = []
+    for token in ApprovalTokenArchive.objects.filter(gatepass_id__in=archived).order_by('created_at'):
+        archived[token.gatepass_id].archived_tokens.append(token)
+
+
+def locate(gatepass_id):
+    """(student_id, is_archived) for a gatepass, or None if it doesn't exist."""
+    student_id = Gatepass.objects.filter(pk=gatepass_id).values_list('student_id', flat=True).first()
+    if student_id is not None:
+        return student_id, False
+    student_id = GatepassArchive.objects.filter(pk=gatepass_id).values_list('student_id', flat=True).first()
+    return (student_id, True) if student_id is not None else None
+
+
+def history_ndjson(gatepass_id, archived=False):
+    """history.stream_ndjson(), or the same lines from an archived gatepass's inlined events."""
+    if not archived:
+        return history.stream_ndjson(gatepass_id)
+    events = GatepassArchive.objects.filter(pk=gatepass_id).values_list('events', flat=True).first() or []
+    return (json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in events)
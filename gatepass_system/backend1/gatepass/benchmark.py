@@ -0,0 +1,159 @@
+"""
+Lifecycle benchmark: students request gatepasses, a parent approves through
+the emailed token link, the warden approves, and security scans the student
+out and back in. Every step goes through the Django test client so URL
+routing, middleware, authentication and views are all measured.
+"""
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import seeding
+from .models import Student, Gatepass, ApprovalToken
+
+PREFIX = 'bench-'
+
+
+def create_population(students, parents_per_student=2, prefix=PREFIX):
+    """
+    Bulk-create `students` student accounts, each with its own parents, plus
+    one warden and one security account. All users share one password hash.
+    Returns (student_users, warden_user, security_user).
+    """
+    password = make_password('test1234')
+    student_rows, _ = seeding.create_students(prefix, 0, students, parents_per_student, password)
+    warden, = seeding.create_accounts([f'{prefix}warden'], 'WARDEN', password)
+    security, = seeding.create_accounts([f'{prefix}security'], 'SECURITY', password)
+    return [student.profile.user for student in student_rows], warden.user, security.user
+
+
+class Recorder:
+    """Collects latency and query count samples per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, name, func, expected_status):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = func()
+            elapsed = time.perf_counter() - started
+        with self._lock:
+            if response.status_code != expected_status:
+                self.errors[name] += 1
+            self.samples[name].append((elapsed, len(queries)))
+        return response
+
+    def report(self, elapsed):
+        """Return one summary dict per endpoint, in first-seen order."""
+        rows = []
+        for name, samples in self.samples.items():
+            latencies = sorted(sample[0] for sample in samples)
+            queries = [sample[1] for sample in samples]
+            pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+            rows.append({
+                'endpoint': name,
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'rps': len(samples) / elapsed if elapsed else 0,
+                'p50_ms': pick(0.50),
+                'p95_ms': pick(0.95),
+                'p99_ms': pick(0.99),
+                'queries_mean': statistics.mean(queries),
+                'queries_max': max(queries),
+            })
+        return rows
+
+
+def _lifecycle(recorder, student_client, parent_client, warden_client, security_client, student_id):
+    start = timezone.localtime() + timezone.timedelta(hours=1)
+    recorder.call('student-request', lambda: student_client.post(reverse('student-request'), {
+        'purpose': 'Benchmark',
+        'destination': 'Town',
+        'from_time': start.strftime('%Y-%m-%dT%H:%M'),
+        'to_time': (start + timezone.timedelta(hours=4)).strftime('%Y-%m-%dT%H:%M'),
+    }), 302)
+    gatepass_id = (
+        Gatepass.objects.filter(student_id=student_id).order_by('-created_at').values_list('pk', flat=True).first()
+    )
+    token = ApprovalToken.objects.filter(gatepass_id=gatepass_id).values_list('token', flat=True).first()
+
+    recorder.call('parent-approve', lambda: parent_client.get(
+        reverse('approval-action', args=[token, 'approve'])
+    ), 200)
+    recorder.call('warden-gatepass-list', lambda: warden_client.get(reverse('warden-gatepass-list')), 200)
+    recorder.call('warden-approve', lambda: warden_client.post(
+        reverse('warden-gatepass-action', args=[gatepass_id, 'approve'])
+    ), 200)
+    recorder.call('student-gatepass-list', lambda: student_client.get(reverse('student-gatepass-list')), 200)
+    recorder.call('security-scan', lambda: security_client.get(reverse('security-scan', args=[gatepass_id])), 200)
+    recorder.call('security-exit', lambda: security_client.post(
+        reverse('security-log-time', args=[gatepass_id, 'exit'])
+    ), 200)
+    recorder.call('security-entry', lambda: security_client.post(
+        reverse('security-log-time', args=[gatepass_id, 'entry'])
+    ), 200)
+
+
+def run(students=50, gatepasses_per_student=2, workers=4, parents_per_student=2, force=False):
+    """
+    Create a population, drive `gatepasses_per_student` full lifecycles per
+    student across `workers` threads, remove the population and return
+    (elapsed_seconds, report_rows). Unless `force` is set this refuses to run
+    against a database holding accounts of its own (see seeding.remove).
+    """
+    seeding.remove(PREFIX, force=force)
+    student_users, warden, security = create_population(students, parents_per_student)
+    student_ids = dict(Student.objects.filter(roll_no__startswith=PREFIX).values_list('profile__user_id', 'pk'))
+    recorder = Recorder()
+
+    def worker(users):
+        warden_client, security_client, parent_client = Client(), Client(), Client()
+        warden_client.force_login(warden)
+        security_client.force_login(security)
+        for user in users:
+            student_client = Client()
+            student_client.force_login(user)
+            for _ in range(gatepasses_per_student):
+                _lifecycle(recorder, student_client, parent_client, warden_client, security_client,
+                           student_ids[user.pk])
+
+    def thread_worker(users):
+        close_old_connections()
+        try:
+            worker(users)
+        finally:
+            close_old_connections()
+
+    # The test client's host isn't in ALLOWED_HOSTS outside the test runner, and
+    # emails would otherwise go to the console backend from the outbox thread
+    with override_settings(
+        ALLOWED_HOSTS=['testserver'],
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    ):
+        try:
+            started = time.perf_counter()
+            if workers <= 1:
+                worker(student_users)
+            else:
+                threads = [
+                    threading.Thread(target=thread_worker, args=(student_users[i::workers],)) for i in range(workers)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            seeding.remove(PREFIX, force=True)
+    return elapsed, recorder.report(elapsed)
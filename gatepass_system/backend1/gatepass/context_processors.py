@@ -1,15 +1,16 @@
+from . import inbox
+from .principal import get_principal
+
 def user_role(request):
-    if request.user.is_authenticated and hasattr(request.user, 'profile'):
-        user_type = request.user.profile.user_type
-        return {
-            'user_role': user_type,
-            'is_warden': user_type == 'WARDEN',
-            'is_security': user_type == 'SECURITY', 
-            'is_student': user_type == 'STUDENT'
-        }
-    return {
-        'user_role': None,
-        'is_warden': False,
-        'is_security': False,
-        'is_student': False
+    principal = get_principal(request)
+    context = {
+        'user_role': principal.role,
+        'is_warden': principal.is_warden,
+        'is_security': principal.is_security,
+        'is_student': principal.role == 'STUDENT',
+        'is_parent': principal.is_parent,
     }
+    if principal.is_parent:
+        # Templates call this only where the badge is rendered; it is a cache read
+        context['parent_pending_count'] = lambda: inbox.pending_count(principal.parent_id)
+    return context
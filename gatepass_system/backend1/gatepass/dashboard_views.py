@@ -1,7 +1,8 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.views.generic import TemplateView
-from django.utils import timezone
 from .models import Gatepass
+from .stats import get_counters
+from . import occupancy
 
 class WardenDashboardView(UserPassesTestMixin, TemplateView):
     template_name = 'warden_dashboard.html'
@@ -12,19 +13,16 @@ class WardenDashboardView(UserPassesTestMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get counts for different statuses
-        context['pending_count'] = Gatepass.objects.filter(status='PENDING').count()
-        context['approved_count'] = Gatepass.objects.filter(status='APPROVED').count()
-        context['rejected_count'] = Gatepass.objects.filter(status='REJECTED').count()
-        context['active_count'] = Gatepass.objects.filter(
-            status='APPROVED',
-            exit_time__isnull=False,
-            return_time__isnull=True
-        ).count()
+        # All status counters come from one cached aggregate query
+        counters = get_counters()
+        context['pending_count'] = counters['pending_parent'] + counters['pending_warden']
+        context['approved_count'] = counters['approved']
+        context['rejected_count'] = counters['rejected']
+        context['active_count'] = counters['students_out']
 
         # Get recent gatepasses
         context['gatepasses'] = Gatepass.objects.select_related(
-            'student', 'student__user'
+            'student', 'student__profile__user'
         ).order_by('-created_at')[:50]
 
         return context
@@ -37,34 +35,12 @@ class SecurityDashboardView(UserPassesTestMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
+        counters = get_counters()
+        context['students_out'] = counters['students_out']
+        context['expected_returns'] = counters['expected_returns']
+        context['pending_verifications'] = counters['pending_verifications']
 
-        # Students currently out
-        context['students_out'] = Gatepass.objects.filter(
-            status='APPROVED',
-            exit_time__isnull=False,
-            return_time__isnull=True
-        ).count()
-
-        # Expected returns today
-        context['expected_returns'] = Gatepass.objects.filter(
-            status='APPROVED',
-            exit_time__isnull=False,
-            return_time__isnull=True,
-            expected_return__date=now.date()
-        ).count()
-
-        # Pending verifications (approved but not yet exited)
-        context['pending_verifications'] = Gatepass.objects.filter(
-            status='APPROVED',
-            exit_time__isnull=True
-        ).count()
-
-        # Active gatepasses
-        context['active_gatepasses'] = Gatepass.objects.filter(
-            status='APPROVED',
-            exit_time__isnull=False,
-            return_time__isnull=True
-        ).select_related('student', 'student__user').order_by('expected_return')[:50]
+        # Active gatepasses, read from the occupancy table
+        context['active_gatepasses'] = [row.gatepass for row in occupancy.students_out()[:50]]
 
         return context
\ No newline at end of file
@@ -0,0 +1,99 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from . import history, inbox
+from .models import Gatepass
+from .signals import notify_changed
+
+# How long a cached "next expiry" is trusted before re-reading it from the
+# database. Gatepasses created by other worker processes are only picked up
+# after this interval, so keep it short relative to the one hour request window.
+RECHECK_SECONDS = getattr(settings, 'GATEPASS_EXPIRY_RECHECK_SECONDS', 60)
+
+
+class ExpiryTracker:
+    """
+    Tracks the earliest pending parent-approval deadline so the expiry sweep
+    only hits the database when something is actually due.
+    """
+
+    def __init__(self, recheck_seconds=RECHECK_SECONDS):
+        self.recheck = timezone.timedelta(seconds=recheck_seconds)
+        self._lock = threading.Lock()
+        self._next_expiry = None
+        self._checked_until = None
+
+    @property
+    def next_expiry(self):
+        return self._next_expiry
+
+    def is_due(self, now):
+        if self._checked_until is None or now >= self._checked_until:
+            return True
+        return self._next_expiry is not None and now >= self._next_expiry
+
+    def note_deadline(self, deadline):
+        """Lower the cached deadline when a new pending request is created."""
+        if deadline is None:
+            return
+        with self._lock:
+            if self._next_expiry is None or deadline < self._next_expiry:
+                self._next_expiry = deadline
+
+    def reset(self):
+        with self._lock:
+            self._next_expiry = None
+            self._checked_until = None
+
+    def expire_due(self, now=None, force=False):
+        """
+        Expire overdue PENDING_PARENT gatepasses. Returns the number of rows
+        updated, which is 0 without touching the database when nothing is due.
+        """
+        now = now or timezone.now()
+        if not force and not self.is_due(now):
+            return 0
+
+        with self._lock:
+            if not force and not self.is_due(now):
+                return 0
+            pending = Gatepass.objects.filter(status='PENDING_PARENT')
+            next_expiry = self._next_expiry
+            if self._checked_until is None or now >= self._checked_until:
+                next_expiry = pending.aggregate(next=Min('request_expires_at'))['next']
+
+            count = 0
+            if force or (next_expiry is not None and now >= next_expiry):
+                expired_ids = list(pending.filter(request_expires_at__lte=now).values_list('pk', flat=True))
+                with transaction.atomic():
+                    count = pending.filter(pk__in=expired_ids).update(status='EXPIRED', version=F('version') + 1)
+                    inbox.remove(expired_ids)
+                    if count == len(expired_ids):
+                        history.record_many(expired_ids, history.event("Expired", 'PENDING_PARENT', 'EXPIRED'))
+                    elif count:
+                        # Some rows were acted on meanwhile; only record the ones that expired
+                        history.record_many(
+                            Gatepass.objects.filter(pk__in=expired_ids, status='EXPIRED').values_list('pk', flat=True),
+                            history.event("Expired", 'PENDING_PARENT', 'EXPIRED'),
+                        )
+                    notify_changed(expired_ids, 'EXPIRED')
+                next_expiry = pending.aggregate(next=Min('request_expires_at'))['next']
+
+            self._next_expiry = next_expiry
+            self._checked_until = now + self.recheck
+        return count
+
+
+tracker = ExpiryTracker()
+
+
+def expire_due(now=None, force=False):
+    return tracker.expire_due(now=now, force=force)
+
+
+def note_deadline(deadline):
+    tracker.note_deadline(deadline)
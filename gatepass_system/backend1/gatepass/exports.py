@@ -0,0 +1,130 @@
+import csv
+import datetime
+import heapq
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import archive
+from .models import Gatepass
+
+# (column header, values() lookup)
+COLUMNS = [
+    ('id', 'id'),
+    ('roll_no', 'student__roll_no'),
+    ('student', 'student__profile__user__username'),
+    ('purpose', 'purpose'),
+    ('destination', 'destination'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('from_time', 'from_time'),
+    ('to_time', 'to_time'),
+    ('actual_exit_time', 'actual_exit_time'),
+    ('actual_entry_time', 'actual_entry_time'),
+]
+# Rows from the live and archive tables are merged on (created_at, id)
+_MERGE_KEY = (
+    [lookup for _, lookup in COLUMNS].index('created_at'),
+    [lookup for _, lookup in COLUMNS].index('id'),
+)
+FORMATS = ('csv', 'ndjson')
+STATUSES = {code for code, _ in Gatepass.STATUS_CHOICES}
+
+
+class InvalidExportFilter(ValueError):
+    pass
+
+
+def _day_start(value, name):
+    day = parse_date(value) if value else None
+    if value and day is None:
+        raise InvalidExportFilter(f"Invalid {name} date, expected YYYY-MM-DD.")
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def filter_gatepasses(date_from=None, date_to=None, status=None, student=None):
+    """
+    Gatepasses created between `date_from` and `date_to` (inclusive
+    YYYY-MM-DD strings), optionally limited to comma-separated `status`
+    codes and a student roll number, oldest first. Returns the live and
+    archived querysets (see archive.querysets()), which export() merges.
+    """
+    filters = {}
+    start = _day_start(date_from, 'from')
+    end = _day_start(date_to, 'to')
+    if start:
+        filters['created_at__gte'] = start
+    if end:
+        filters['created_at__lt'] = end + datetime.timedelta(days=1)
+    if status:
+        statuses = [code.strip().upper() for code in status.split(',') if code.strip()]
+        unknown = set(statuses) - STATUSES
+        if unknown:
+            raise InvalidExportFilter(f"Unknown status: {', '.join(sorted(unknown))}.")
+        filters['status__in'] = statuses
+    if student:
+        filters['student__roll_no'] = student
+    return [queryset.order_by('created_at', 'id') for queryset in archive.querysets(**filters)]
+
+
+def rows(querysets, chunk_size=2000):
+    """
+    Yield one tuple per gatepass, in COLUMNS order, merged oldest first
+    across `querysets`. Each is read from a server-side cursor so memory
+    stays flat however many rows match.
+    """
+    lookups = [lookup for _, lookup in COLUMNS]
+    return heapq.merge(
+        *(queryset.values_list(*lookups).iterator(chunk_size=chunk_size) for queryset in querysets),
+        key=lambda row: (row[_MERGE_KEY[0]], row[_MERGE_KEY[1]]),
+    )
+
+
+class _Echo:
+    # csv.writer only needs write(); hand each formatted line straight back
+    def write(self, value):
+        return value
+
+
+def _batched(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def csv_lines(querysets, chunk_size=2000):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow([header for header, _ in COLUMNS])
+        for row in rows(querysets, chunk_size):
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    # Yield a few hundred rows at a time rather than one write per row
+    return _batched(lines(), 500)
+
+
+def ndjson_lines(querysets, chunk_size=2000):
+    headers = [header for header, _ in COLUMNS]
+
+    def lines():
+        for row in rows(querysets, chunk_size):
+            yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+    return _batched(lines(), 500)
+
+
+def export(querysets, fmt='csv', chunk_size=2000):
+    """Return an iterator of text chunks for filter_gatepasses() `querysets` in the given format."""
+    if fmt == 'ndjson':
+        return ndjson_lines(querysets, chunk_size)
+    return csv_lines(querysets, chunk_size)
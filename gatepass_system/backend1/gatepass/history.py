@@ -0,0 +1,45 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import GatepassEvent
+
+
+def event(action, old_status='', new_status='', actor='', **data):
+    """Build an unsaved GatepassEvent-compatible dict."""
+    return {
+        'action': action,
+        'old_status': old_status or '',
+        'new_status': new_status or '',
+        'actor': actor or '',
+        'data': data,
+    }
+
+
+def record(gatepass_id, entry):
+    return GatepassEvent.objects.create(gatepass_id=gatepass_id, **entry)
+
+
+def record_many(gatepass_ids, entry):
+    """Insert the same event for several gatepasses with one INSERT."""
+    return GatepassEvent.objects.bulk_create([
+        GatepassEvent(gatepass_id=gatepass_id, **entry) for gatepass_id in gatepass_ids
+    ])
+
+
+def stream(gatepass_id, chunk_size=500):
+    """
+    Lazily iterate over a gatepass's history, oldest first, without
+    loading it all into memory.
+    """
+    return (
+        GatepassEvent.objects.filter(gatepass_id=gatepass_id)
+        .order_by('created_at', 'id')
+        .values('id', 'action', 'old_status', 'new_status', 'actor', 'data', 'created_at')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def stream_ndjson(gatepass_id, chunk_size=500):
+    for row in stream(gatepass_id, chunk_size):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Gatepass, ParentInbox, Student
+
+# Counts are dropped from the shared cache on every inbox change; the TTL only
+# bounds how long a missed invalidation can show
+COUNT_CACHE_TTL = getattr(settings, 'GATEPASS_INBOX_COUNT_TTL_SECONDS', 60)
+# Keeps gatepass id lookups for large expiry sweeps under the database's parameter limit
+BATCH_SIZE = 500
+
+
+def _count_key(parent_id):
+    return f'gatepass:parent-pending:{parent_id}'
+
+
+def _invalidate_counts(parent_ids):
+    keys = [_count_key(parent_id) for parent_id in set(parent_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def add(gatepass):
+    """Put a new PENDING_PARENT request in each of the student's parents' inboxes."""
+    parent_ids = list(Student.parents.through.objects.filter(student_id=gatepass.student_id).values_list('parent_id', flat=True))
+    ParentInbox.objects.bulk_create([
+        ParentInbox(parent_id=parent_id, gatepass=gatepass, expires_at=gatepass.request_expires_at)
+        for parent_id in parent_ids
+    ], ignore_conflicts=True)
+    _invalidate_counts(parent_ids)
+
+
+def remove(gatepass_ids):
+    """Drop requests that are no longer waiting on a parent from every inbox."""
+    gatepass_ids = list(gatepass_ids)
+    for start in range(0, len(gatepass_ids), BATCH_SIZE):
+        entries = ParentInbox.objects.filter(gatepass_id__in=gatepass_ids[start:start + BATCH_SIZE])
+        parent_ids = list(entries.values_list('parent_id', flat=True))
+        if parent_ids:
+            entries.delete()
+            _invalidate_counts(parent_ids)
+
+
+def pending(parent_id):
+    """The parent's open requests, soonest to expire first, from one index range."""
+    return (
+        ParentInbox.objects.filter(parent_id=parent_id)
+        .select_related('gatepass__student__profile__user')
+        .order_by('expires_at')
+    )
+
+
+def pending_count(parent_id):
+    key = _count_key(parent_id)
+    count = cache.get(key)
+    if count is None:
+        count = ParentInbox.objects.filter(parent_id=parent_id).count()
+        cache.set(key, count, COUNT_CACHE_TTL)
+    return count
+
+
+def rebuild():
+    """
+    Rebuild every inbox from PENDING_PARENT gatepasses. Returns the number
+    of inbox rows.
+    """
+    links = Gatepass.objects.filter(status='PENDING_PARENT', request_expires_at__isnull=False).values_list(
+        'student__parents__pk', 'pk', 'request_expires_at'
+    )
+
+    with transaction.atomic():
+        stale = set(ParentInbox.objects.values_list('parent_id', flat=True).distinct())
+        ParentInbox.objects.all().delete()
+        rows = ParentInbox.objects.bulk_create([
+            ParentInbox(parent_id=parent_id, gatepass_id=gatepass_id, expires_at=expires_at)
+            for parent_id, gatepass_id, expires_at in links.iterator()
+            if parent_id is not None
+        ], batch_size=1000)
+    cache.delete_many([_count_key(parent_id) for parent_id in stale | {row.parent_id for row in rows}])
+    return len(rows)
+
+
+@receiver(m2m_changed, sender=Student.parents.through)
+def _parents_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep inboxes in step with parent links made or removed while a request
+    is pending. `instance` is a Student, or a Parent when changed from
+    parent.children.
+    """
+    if action == 'post_add' and pk_set:
+        student_ids, parent_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+        # Every (student, parent) pair here was just linked
+        pending_requests = list(
+            Gatepass.objects.filter(student_id__in=student_ids, status='PENDING_PARENT')
+            .values_list('pk', 'student_id', 'request_expires_at')
+        )
+        ParentInbox.objects.bulk_create([
+            ParentInbox(parent_id=parent_id, gatepass_id=gatepass_id, expires_at=expires_at)
+            for gatepass_id, student_id, expires_at in pending_requests
+            for parent_id in parent_ids
+            if expires_at is not None
+        ], ignore_conflicts=True)
+        _invalidate_counts(parent_ids)
+    elif action in ('post_remove', 'pre_clear'):
+        if reverse:
+            entries = ParentInbox.objects.filter(parent_id=instance.pk)
+            if pk_set is not None:
+                entries = entries.filter(gatepass__student_id__in=pk_set)
+        else:
+            entries = ParentInbox.objects.filter(gatepass__student_id=instance.pk)
+            if pk_set is not None:
+                entries = entries.filter(parent_id__in=pk_set)
+        parent_ids = list(entries.values_list('parent_id', flat=True))
+        if parent_ids:
+            ParentInbox.objects.filter(pk__in=entries.values('pk')).delete()
+            _invalidate_counts(parent_ids)
@@ -0,0 +1,151 @@
+"""
+Server-sent event feed of gatepass history for the staff dashboards.
+
+Streams tail the GatepassEvent table by id. Streams in this process are
+woken as soon as a change commits; changes made by other processes are
+picked up by a periodic re-check, which doubles as the keep-alive.
+
+Holding a stream open needs the ASGI entry point (backend.asgi). Under WSGI
+every worker thread would be tied up by one browser, so each request gets a
+snapshot of what is new and the browser polls again after POLL_RETRY_MS.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.dispatch import receiver
+
+from .models import GatepassEvent
+from .signals import gatepass_changed
+from .stats import get_counters
+
+POLL_SECONDS = getattr(settings, 'GATEPASS_LIVE_POLL_SECONDS', 15)
+# Streams end after this long and the browser reconnects with Last-Event-ID
+MAX_STREAM_SECONDS = getattr(settings, 'GATEPASS_LIVE_MAX_STREAM_SECONDS', 300)
+RETRY_MS = 3000
+# Every WSGI poll is a full request through the middleware, so poll slowly
+POLL_RETRY_MS = getattr(settings, 'GATEPASS_LIVE_POLL_RETRY_SECONDS', 30) * 1000
+BATCH_SIZE = 100
+
+
+class Notifier:
+    """Wakes event streams in this process when gatepasses change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+
+    def subscribe(self):
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters[event] = asyncio.get_running_loop()
+        return event
+
+    def unsubscribe(self, event):
+        with self._lock:
+            self._waiters.pop(event, None)
+
+    def notify(self):
+        # Called from request threads after commit; the streams live on event loops
+        with self._lock:
+            waiters = list(self._waiters.items())
+        for event, loop in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop has shut down
+                self.unsubscribe(event)
+
+
+notifier = Notifier()
+
+
+@receiver(gatepass_changed)
+def _gatepass_changed(sender, **kwargs):
+    notifier.notify()
+
+
+def latest_id():
+    return GatepassEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def fetch_events(after_id, limit=BATCH_SIZE):
+    rows = (
+        GatepassEvent.objects.filter(id__gt=after_id)
+        .order_by('id')
+        .values(
+            'id', 'gatepass_id', 'action', 'old_status', 'new_status', 'actor', 'created_at',
+            'gatepass__student__roll_no', 'gatepass__student__profile__user__username',
+            'gatepass__student__profile__user__first_name', 'gatepass__student__profile__user__last_name',
+            'gatepass__destination', 'gatepass__purpose', 'gatepass__from_time', 'gatepass__to_time',
+        )[:limit]
+    )
+    events = []
+    for row in rows:
+        name = ' '.join(filter(None, [
+            row['gatepass__student__profile__user__first_name'], row['gatepass__student__profile__user__last_name'],
+        ])) or row['gatepass__student__profile__user__username']
+        events.append({
+            'id': row['id'],
+            'gatepass_id': row['gatepass_id'],
+            'action': row['action'],
+            'old_status': row['old_status'],
+            'new_status': row['new_status'],
+            'actor': row['actor'],
+            'created_at': row['created_at'],
+            # Matches Student.__str__
+            'student': f"{name} ({row['gatepass__student__roll_no']})" if name else f"Student ({row['gatepass__student__roll_no']})",
+            'destination': row['gatepass__destination'],
+            'purpose': row['gatepass__purpose'],
+            'from_time': row['gatepass__from_time'],
+            'to_time': row['gatepass__to_time'],
+        })
+    return events
+
+
+def format_event(name, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def format_batch(events):
+    """SSE text for a batch of history events followed by fresh dashboard counters."""
+    chunks = [format_event('gatepass', event, event['id']) for event in events]
+    chunks.append(format_event('stats', get_counters()))
+    return ''.join(chunks)
+
+
+def snapshot(after_id):
+    """One-shot response body for servers that cannot hold a stream open."""
+    events = fetch_events(after_id)
+    return f'retry: {POLL_RETRY_MS}\n\n' + (format_batch(events) if events else '')
+
+
+async def stream(after_id, max_seconds=MAX_STREAM_SECONDS):
+    """Async iterator of SSE text for every history event after `after_id`."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    wakeup = notifier.subscribe()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while loop.time() < deadline:
+            # Cleared before reading so a change committed mid-read still wakes us
+            wakeup.clear()
+            events = await sync_to_async(fetch_events)(after_id)
+            if events:
+                after_id = events[-1]['id']
+                yield await sync_to_async(format_batch)(events)
+                if len(events) == BATCH_SIZE:
+                    continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), min(POLL_SECONDS, max(deadline - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+    finally:
+        notifier.unsubscribe(wakeup)
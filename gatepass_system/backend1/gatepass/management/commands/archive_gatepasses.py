@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from gatepass import archive
+
+class Command(BaseCommand):
+    help = (
+        'Moves closed gatepasses older than the retention window, with their history '
+        'and approval tokens, into the archive tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.RETENTION_DAYS,
+                            help='Archive closed gatepasses created more than N days ago.')
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE)
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and archive every N seconds (0 runs once).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = archive.archive_closed(days=options['days'], batch_size=options['batch_size'])
+            if count or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'Archived {count} gatepasses.'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from gatepass import benchmark, seeding
+
+class Command(BaseCommand):
+    help = (
+        'Drives full gatepass lifecycles (request, parent approval, warden approval, exit, entry) '
+        'through the test client with concurrent workers and reports per-endpoint latency and query counts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50)
+        parser.add_argument('--gatepasses', type=int, default=2, help='Lifecycles per student.')
+        parser.add_argument('--parents', type=int, default=2, help='Parents per student.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Run even though the database has other accounts; rows named bench-* are deleted.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            elapsed, rows = benchmark.run(
+                students=options['students'],
+                gatepasses_per_student=options['gatepasses'],
+                workers=options['workers'],
+                parents_per_student=options['parents'],
+                force=options['force'],
+            )
+        except seeding.SeedingError as exc:
+            raise CommandError(str(exc))
+        if options['json']:
+            self.stdout.write(json.dumps({'elapsed_seconds': elapsed, 'endpoints': rows}, indent=2))
+            return
+
+        lifecycles = options['students'] * options['gatepasses']
+        self.stdout.write(self.style.SUCCESS(
+            f'{lifecycles} lifecycles with {options["workers"]} workers in {elapsed:.2f}s '
+            f'({lifecycles / elapsed:.1f} lifecycles/s)'
+        ))
+        self.stdout.write(
+            f'{"endpoint":<24}{"reqs":>7}{"errors":>7}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"queries":>9}{"max":>5}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["endpoint"]:<24}{row["requests"]:>7}{row["errors"]:>7}{row["rps"]:>8.1f}'
+                f'{row["p50_ms"]:>9.2f}{row["p95_ms"]:>9.2f}{row["p99_ms"]:>9.2f}'
+                f'{row["queries_mean"]:>9.1f}{row["queries_max"]:>5}'
+            )
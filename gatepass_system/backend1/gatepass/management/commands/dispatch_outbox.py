@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from gatepass.notifications import dispatch_pending
+
+class Command(BaseCommand):
+    help = 'Sends queued outbox emails, retrying failed deliveries with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=1, help='Number of dispatcher threads.')
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and poll the outbox every N seconds (0 drains it once).'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                results = list(executor.map(self._dispatch, [options['batch_size']] * workers))
+                sent = sum(r[0] for r in results)
+                failed = sum(r[1] for r in results)
+                if sent or failed:
+                    self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed.'))
+                    continue
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+    def _dispatch(self, batch_size):
+        close_old_connections()
+        try:
+            return dispatch_pending(batch_size)
+        finally:
+            close_old_connections()
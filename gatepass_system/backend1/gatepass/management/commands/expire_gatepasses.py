@@ -1,17 +1,37 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from gatepass.models import Gatepass
+from gatepass.expiry import ExpiryTracker
 
 class Command(BaseCommand):
     help = 'Expires gatepasses that have not been approved or rejected by parents in time.'
 
-    def handle(self, *args, **options):
-        now = timezone.now()
-        expired_gatepasses = Gatepass.objects.filter(
-            status='PENDING_PARENT',
-            request_expires_at__lte=now
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and sweep at most every N seconds (0 runs a single sweep).'
         )
 
-        count = expired_gatepasses.update(status='EXPIRED')
+    def handle(self, *args, **options):
+        interval = options['interval']
+        tracker = ExpiryTracker(recheck_seconds=interval or 60)
 
+        count = tracker.expire_due(force=True)
         self.stdout.write(self.style.SUCCESS(f'Successfully expired {count} gatepasses.'))
+
+        while interval:
+            time.sleep(self._seconds_until_due(tracker, interval))
+            count = tracker.expire_due()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f'Successfully expired {count} gatepasses.'))
+
+    def _seconds_until_due(self, tracker, interval):
+        # Wake up for the next known deadline if it comes before the regular interval
+        next_expiry = tracker.next_expiry
+        if next_expiry is None:
+            return interval
+        remaining = (next_expiry - timezone.now()).total_seconds()
+        return min(interval, max(remaining, 0))
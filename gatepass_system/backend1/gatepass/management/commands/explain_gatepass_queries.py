@@ -0,0 +1,99 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from gatepass import seeding
+from gatepass.models import Student, Gatepass
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Prints query plans and timings for the hot Gatepass queries, with and without the Gatepass indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Insert N synthetic gatepasses before explaining.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self._seed(options['seed'], options['batch_size'])
+
+        self.stdout.write(f'Gatepass rows: {Gatepass.objects.count()}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nWith indexes'))
+        self._explain_all()
+
+        # Drop the indexes inside a transaction that is always rolled back
+        connection.disable_constraint_checking()
+        try:
+            with transaction.atomic():
+                with connection.schema_editor(atomic=False) as editor:
+                    for index in Gatepass._meta.indexes:
+                        editor.remove_index(Gatepass, index)
+                self.stdout.write(self.style.MIGRATE_HEADING('\nWithout indexes'))
+                self._explain_all()
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            connection.enable_constraint_checking()
+
+    def _hot_queries(self):
+        now = timezone.now()
+        student = Student.objects.order_by('?').first()
+        return [
+            ('expiry sweep', Gatepass.objects.filter(status='PENDING_PARENT', request_expires_at__lte=now)),
+            ('warden list', Gatepass.objects.order_by('-created_at')[:50]),
+            ('warden dashboard', Gatepass.objects.filter(status='PENDING_WARDEN').order_by('-created_at')[:50]),
+            ('student history', Gatepass.objects.filter(student=student).order_by('-created_at')[:50]),
+            ('currently out', Gatepass.objects.filter(
+                status='APPROVED', actual_exit_time__isnull=False, actual_entry_time__isnull=True
+            )),
+        ]
+
+    def _explain_all(self):
+        for name, queryset in self._hot_queries():
+            started = time.perf_counter()
+            list(queryset)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(f'{name} ({elapsed:.2f} ms)'))
+            self.stdout.write(queryset.explain())
+
+    def _seed(self, rows, batch_size):
+        now = timezone.now()
+        students = list(Student.objects.all()[:1000])
+        if not students:
+            students, _ = seeding.create_students('explain-', 0, 1000)
+
+        # Only the most recent requests can still be pending; older ones are closed
+        closed = ['EXPIRED', 'REJECTED', 'APPROVED', 'APPROVED', 'APPROVED']
+        open_ = ['PENDING_PARENT', 'PENDING_WARDEN', 'APPROVED']
+        for start in range(0, rows, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, rows)):
+                created_at = now - timezone.timedelta(minutes=rows - i)
+                status = random.choice(open_ if i >= rows - 500 else closed)
+                exit_time = created_at + timezone.timedelta(hours=2) if status == 'APPROVED' else None
+                entry_time = exit_time + timezone.timedelta(hours=4) if exit_time and i < rows - 500 else None
+                batch.append(Gatepass(
+                    student=random.choice(students),
+                    purpose='Benchmark',
+                    destination='Town',
+                    from_time=created_at,
+                    to_time=created_at + timezone.timedelta(hours=8),
+                    status=status,
+                    request_expires_at=created_at + timezone.timedelta(hours=1),
+                    actual_exit_time=exit_time,
+                    actual_entry_time=entry_time,
+                ))
+            Gatepass.objects.bulk_create(batch)
+            self.stdout.write(f'Seeded {start + len(batch)} / {rows} gatepasses')
+
+        # auto_now_add overwrites created_at on insert; spread it out again for realistic ordering
+        Gatepass.objects.filter(purpose='Benchmark').update(created_at=F('from_time'))
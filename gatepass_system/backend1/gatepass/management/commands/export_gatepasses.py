@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from gatepass import exports
+
+class Command(BaseCommand):
+    help = 'Streams gatepasses to a CSV or NDJSON file (or stdout) without loading them into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', help='First creation date, YYYY-MM-DD.')
+        parser.add_argument('--to', dest='date_to', help='Last creation date, YYYY-MM-DD.')
+        parser.add_argument('--status', help='Comma-separated status codes.')
+        parser.add_argument('--student', help='Student roll number.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--output', '-o', help='File to write (default: stdout).')
+
+    def handle(self, *args, **options):
+        try:
+            querysets = exports.filter_gatepasses(
+                options['date_from'], options['date_to'], options['status'], options['student']
+            )
+        except exports.InvalidExportFilter as e:
+            raise CommandError(str(e))
+
+        chunks = exports.export(querysets, options['format'], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exported gatepasses to {options["output"]}.'))
@@ -0,0 +1,140 @@
+import multiprocessing
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from gatepass import inbox, occupancy, seeding, stats
+from gatepass.models import Student, Gatepass, ApprovalToken
+
+# Requests newer than this may still be open; older ones are closed
+OPEN_WINDOW = timezone.timedelta(hours=24)
+OPEN_STATUSES = ['PENDING_PARENT', 'PENDING_WARDEN', 'APPROVED']
+# Weighted: most passes are used and returned, some were never used
+CLOSED_STATUSES = ['APPROVED'] * 7 + ['REJECTED'] * 2 + ['EXPIRED'] * 2
+
+
+def _generate_chunk(task):
+    """
+    Create the students [start, end) with their users, profiles and parents,
+    then the gatepasses [gp_start, gp_end) spread over those students.
+    Runs in a worker process when --processes > 1.
+    """
+    (prefix, start, end, parents_per_student, gp_start, gp_end, gp_total,
+     now, days, batch_size, password, seed) = task
+    rng = random.Random(seed + start)
+    span = timezone.timedelta(days=days)
+
+    students, parent_ids = seeding.create_students(
+        f'{prefix}-', start, end, parents_per_student, password, batch_size,
+    )
+    for batch_start in range(gp_start, gp_end, batch_size):
+        gatepasses, tokens = [], []
+        for g in range(batch_start, min(batch_start + batch_size, gp_end)):
+            # Oldest first across the whole run, so created_at follows the global index
+            created_at = now - span * (1 - g / gp_total)
+            is_open = now - created_at < OPEN_WINDOW
+            status = rng.choice(OPEN_STATUSES if is_open else CLOSED_STATUSES)
+            exit_time = entry_time = None
+            if status == 'APPROVED' and rng.random() < 0.85:
+                exit_time = created_at + timezone.timedelta(hours=rng.uniform(1, 4))
+                if not is_open:
+                    entry_time = exit_time + timezone.timedelta(hours=rng.uniform(1, 12))
+            gatepass = Gatepass(
+                id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                student=rng.choice(students),
+                purpose='Home visit',
+                destination='Town',
+                from_time=created_at,
+                to_time=created_at + timezone.timedelta(hours=12),
+                status=status,
+                request_expires_at=created_at + timezone.timedelta(hours=1),
+                actual_exit_time=exit_time,
+                actual_entry_time=entry_time,
+            )
+            gatepasses.append(gatepass)
+            if status == 'PENDING_PARENT':
+                tokens.extend(
+                    ApprovalToken(gatepass=gatepass, parent_id=parent_id, expires_at=gatepass.request_expires_at)
+                    for parent_id in parent_ids[gatepass.student_id]
+                )
+
+        with transaction.atomic():
+            Gatepass.objects.bulk_create(gatepasses)
+            # auto_now_add overwrites created_at on insert; requests were made at from_time
+            Gatepass.objects.filter(pk__in=[gatepass.pk for gatepass in gatepasses]).update(created_at=F('from_time'))
+            ApprovalToken.objects.bulk_create(tokens, batch_size=batch_size)
+
+    connections.close_all()
+    return end - start, gp_end - gp_start
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic students, parents and gatepasses in every status for load testing, '
+        'using batched bulk inserts and optionally several processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100_000)
+        parser.add_argument('--parents-per-student', type=int, default=2)
+        parser.add_argument('--gatepasses', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=365, help='Spread gatepasses over the last N days.')
+        parser.add_argument('--chunk', type=int, default=2000, help='Students per unit of work.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--prefix', default='load', help='Prefix for usernames and roll numbers.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Student.objects.filter(roll_no__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Data with prefix "{prefix}" already exists; pass a different --prefix.')
+        students, gatepasses = options['students'], options['gatepasses']
+        if students < 1:
+            raise CommandError('--students must be at least 1.')
+
+        # One hash for every account; hashing is by far the slowest part of creating a user
+        password = make_password('test1234')
+        now = timezone.now()
+        tasks = []
+        for start in range(0, students, options['chunk']):
+            end = min(start + options['chunk'], students)
+            tasks.append((
+                prefix, start, end, options['parents_per_student'],
+                gatepasses * start // students, gatepasses * end // students, max(gatepasses, 1),
+                now, options['days'], options['batch_size'], password, options['seed'],
+            ))
+
+        started = time.perf_counter()
+        done_students = done_gatepasses = 0
+        if options['processes'] > 1:
+            # Children must open their own connections rather than share the parent's
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                results = pool.imap_unordered(_generate_chunk, tasks)
+                for created_students, created_gatepasses in results:
+                    done_students += created_students
+                    done_gatepasses += created_gatepasses
+                    self._progress(done_students, done_gatepasses, started)
+        else:
+            for task in tasks:
+                created_students, created_gatepasses = _generate_chunk(task)
+                done_students += created_students
+                done_gatepasses += created_gatepasses
+                self._progress(done_students, done_gatepasses, started)
+
+        out = occupancy.rebuild()
+        inbox.rebuild()
+        stats.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {done_students} students, {done_students * options["parents_per_student"]} parents and '
+            f'{done_gatepasses} gatepasses in {time.perf_counter() - started:.1f}s; {out} students currently out.'
+        ))
+
+    def _progress(self, students, gatepasses, started):
+        self.stdout.write(f'{students} students, {gatepasses} gatepasses ({time.perf_counter() - started:.1f}s)')
@@ -0,0 +1,125 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+from gatepass import seeding
+from gatepass.models import Gatepass
+from gatepass.movements import apply_movements
+
+PREFIX = 'loadtest-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures write throughput of concurrent gate scans (exit then entry per gatepass) '
+        'against the configured database. Creates and removes its own test rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gatepasses', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent scanning gates.')
+        parser.add_argument('--keep', action='store_true', help='Do not delete the generated rows afterwards.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Run even though the database has other accounts; rows named loadtest-* are deleted.',
+        )
+
+    def handle(self, *args, **options):
+        self._describe_database()
+        try:
+            seeding.remove(PREFIX, force=options['force'])
+        except seeding.SeedingError as exc:
+            raise CommandError(str(exc))
+        ids = self._seed(options['gatepasses'])
+        try:
+            self._run(ids, options['threads'])
+        finally:
+            if not options['keep']:
+                seeding.remove(PREFIX, force=True)
+
+    def _describe_database(self):
+        settings = connection.settings_dict
+        line = f"Database: {connection.vendor} {settings['NAME']}"
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                line += f" (journal_mode={cursor.fetchone()[0]})"
+        else:
+            line += f" (CONN_MAX_AGE={settings['CONN_MAX_AGE']}, pool={'pool' in settings['OPTIONS']})"
+        self.stdout.write(line)
+
+    def _seed(self, count):
+        now = timezone.now()
+        students_count = max(1, count // 4)
+        students, _ = seeding.create_students(PREFIX, 0, students_count)
+        gatepasses = Gatepass.objects.bulk_create([
+            Gatepass(
+                student=students[i % students_count],
+                purpose='Load test',
+                destination='Town',
+                from_time=now,
+                to_time=now + timezone.timedelta(hours=4),
+                request_expires_at=now,
+                status='APPROVED',
+            )
+            for i in range(count)
+        ], batch_size=seeding.BATCH_SIZE)
+        return [gatepass.pk for gatepass in gatepasses]
+
+    def _run(self, ids, threads):
+        latencies = []
+        retries = [0]
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def scan(gatepass_id, action):
+            for attempt in range(50):
+                started = time.perf_counter()
+                try:
+                    apply_movements([{'gatepass_id': gatepass_id, 'action': action}], actor='loadtest')
+                except OperationalError:
+                    with lock:
+                        retries[0] += 1
+                    time.sleep(0.005 * (attempt + 1))
+                    continue
+                return time.perf_counter() - started
+            raise RuntimeError(f'Gave up on {action} for {gatepass_id}')
+
+        def gate(chunk):
+            close_old_connections()
+            timings = []
+            try:
+                barrier.wait()
+                for gatepass_id in chunk:
+                    timings.append(scan(gatepass_id, 'exit'))
+                for gatepass_id in chunk:
+                    timings.append(scan(gatepass_id, 'entry'))
+            finally:
+                close_old_connections()
+            with lock:
+                latencies.extend(timings)
+
+        workers = [threading.Thread(target=gate, args=(ids[i::threads],)) for i in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            self.stderr.write(self.style.ERROR('No scans completed.'))
+            return
+        latencies.sort()
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(latencies)} scans from {threads} gates in {elapsed:.2f}s: '
+            f'{len(latencies) / elapsed:.0f} writes/s'
+        ))
+        self.stdout.write(
+            f'latency ms: mean {statistics.mean(latencies) * 1000:.2f}, p50 {p(0.5):.2f}, '
+            f'p95 {p(0.95):.2f}, p99 {p(0.99):.2f}; lock retries: {retries[0]}'
+        )
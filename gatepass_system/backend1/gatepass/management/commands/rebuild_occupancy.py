@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from gatepass import occupancy
+
+class Command(BaseCommand):
+    help = 'Rebuilds the "currently out" occupancy table from gatepass exit/entry history.'
+
+    def handle(self, *args, **options):
+        count = occupancy.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Occupancy rebuilt: {count} students currently out.'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from gatepass import inbox
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-parent pending request inboxes from PENDING_PARENT gatepasses.'
+
+    def handle(self, *args, **options):
+        count = inbox.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Parent inboxes rebuilt: {count} pending entries.'))
@@ -25,7 +25,7 @@ class Command(BaseCommand):
             parents = Parent.objects.all()
             for i, parent in enumerate(parents, 1):
                 # Create user for parent if doesn't exist
-                if not hasattr(parent, 'profile'):
+                if parent.profile is None:
                     parent_user = self._create_user(
                         f'parent{i}', 
                         parent.name, 
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+class Command(BaseCommand):
+    help = (
+        'Switches the SQLite database file to WAL (readers alongside the single writer) or back to the '
+        'default rollback journal. The mode is stored in the file, so this only needs to run once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=['wal', 'delete'])
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'The database is {connection.vendor}, not SQLite.')
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode={options['mode'].upper()}")
+            mode = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS(f"{connection.settings_dict['NAME']}: journal_mode={mode}"))
+        if mode == 'wal':
+            self.stdout.write('Set GATEPASS_DB_SQLITE_WAL=1 so connections use synchronous=NORMAL.')
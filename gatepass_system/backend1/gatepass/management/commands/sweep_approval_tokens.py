@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from gatepass import tokens
+
+class Command(BaseCommand):
+    help = (
+        'Moves used or expired approval tokens older than the retention window '
+        'into the token archive, in bounded batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=tokens.RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=tokens.BATCH_SIZE)
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and sweep every N seconds (0 runs a single sweep).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = tokens.archive_stale(retention_days=options['retention_days'], batch_size=options['batch_size'])
+            if count or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'Archived {count} approval tokens.'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
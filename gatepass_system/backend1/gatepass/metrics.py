@@ -0,0 +1,190 @@
+"""
+In-process request metrics: per-view latency and query histograms, cache
+hit/miss counters and a slow-request log. Each server process keeps its own
+counters, so scrape every worker (or run one worker per scrape target).
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('gatepass.slow_requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SLOW_REQUEST_SECONDS = getattr(settings, 'GATEPASS_SLOW_REQUEST_MS', 500) / 1000
+# Statements kept per request for the slow log; the slowest are reported
+MAX_RECORDED_QUERIES = 200
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield bound, running
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.query_seconds = defaultdict(float)
+            self.responses = defaultdict(int)
+            self.cache = defaultdict(int)
+
+    def observe_request(self, view, method, status_code, seconds, query_count, query_seconds):
+        with self._lock:
+            self.latency[(view, method)].observe(seconds)
+            self.queries[(view, method)].observe(query_count)
+            self.query_seconds[(view, method)] += query_seconds
+            self.responses[(view, method, status_code)] += 1
+
+    def observe_cache(self, name, hit):
+        with self._lock:
+            self.cache[(name, 'hit' if hit else 'miss')] += 1
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            self._histogram(lines, 'gatepass_request_duration_seconds', 'Request latency by view.', self.latency)
+            self._histogram(lines, 'gatepass_request_queries', 'Database queries per request by view.', self.queries)
+
+            lines.append('# HELP gatepass_request_query_seconds_total Time spent in database queries by view.')
+            lines.append('# TYPE gatepass_request_query_seconds_total counter')
+            for (view, method), seconds in sorted(self.query_seconds.items()):
+                lines.append(f'gatepass_request_query_seconds_total{_labels(view=view, method=method)} {seconds:.6f}')
+
+            lines.append('# HELP gatepass_responses_total Responses by view and status code.')
+            lines.append('# TYPE gatepass_responses_total counter')
+            for (view, method, code), count in sorted(self.responses.items()):
+                lines.append(f'gatepass_responses_total{_labels(view=view, method=method, status=code)} {count}')
+
+            lines.append('# HELP gatepass_cache_requests_total Cache lookups by cache and result.')
+            lines.append('# TYPE gatepass_cache_requests_total counter')
+            for (name, result), count in sorted(self.cache.items()):
+                lines.append(f'gatepass_cache_requests_total{_labels(cache=name, result=result)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram(lines, name, help_text, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (view, method), histogram in sorted(histograms.items()):
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{_labels(view=view, method=method, le=bound)} {count}')
+            lines.append(f'{name}_bucket{_labels(view=view, method=method, le="+Inf")} {histogram.total}')
+            lines.append(f'{name}_sum{_labels(view=view, method=method)} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{_labels(view=view, method=method)} {histogram.total}')
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = Registry()
+
+
+def cache_hit(name):
+    registry.observe_cache(name, True)
+
+
+def cache_miss(name):
+    registry.observe_cache(name, False)
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that times every statement of a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < MAX_RECORDED_QUERIES:
+                self.statements.append((elapsed, sql))
+
+
+def _view_name(request):
+    # URL name where there is one, else the view's dotted path
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and query time for every request under its
+    URL name, and logs requests slower than GATEPASS_SLOW_REQUEST_MS with
+    their slowest SQL statements.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = _view_name(request)
+        registry.observe_request(view, request.method, response.status_code, elapsed, recorder.count, recorder.seconds)
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            slowest = sorted(recorder.statements, key=lambda statement: statement[0], reverse=True)[:5]
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms\n%s",
+                request.method, request.path, view, elapsed * 1000, recorder.count, recorder.seconds * 1000,
+                '\n'.join(f'  {seconds * 1000:.1f} ms  {sql}' for seconds, sql in slowest),
+            )
+        return response
+
+
+def _scrape_allowed(request):
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'GATEPASS_METRICS_TOKEN', '')
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'GATEPASS_METRICS_ALLOWED_IPS', [])
+
+
+def metrics_view(request):
+    if not _scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,18 +1,11 @@
-from django.utils import timezone
-from .models import Gatepass
+from .expiry import expire_due
 
 class GatepassExpiryMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Check and expire gatepasses before processing the request
-        now = timezone.now()
-        Gatepass.objects.filter(
-            status='PENDING_PARENT',
-            request_expires_at__lte=now
-        ).update(
-            status='EXPIRED'
-        )
-        
+        # Expire overdue gatepasses, but only query once the earliest deadline has passed
+        expire_due()
+
         return self.get_response(request)
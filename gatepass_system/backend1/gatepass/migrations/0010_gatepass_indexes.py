@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0009_alter_gatepass_from_time_alter_gatepass_purpose_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(fields=['-created_at'], name='gatepass_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(fields=['status', '-created_at'], name='gatepass_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(fields=['student', '-created_at'], name='gatepass_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(fields=['status', 'request_expires_at'], name='gatepass_status_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(condition=models.Q(('status', 'PENDING_PARENT')), fields=['request_expires_at'], name='gatepass_pending_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(fields=['status', 'actual_entry_time', 'actual_exit_time'], name='gatepass_status_entry_exit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gatepass',
+            index=models.Index(condition=models.Q(('actual_entry_time__isnull', True), ('actual_exit_time__isnull', False), ('status', 'APPROVED')), fields=['actual_exit_time'], name='gatepass_currently_out_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0011_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parent',
+            name='profile',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='gatepass.profile'),
+        ),
+    ]
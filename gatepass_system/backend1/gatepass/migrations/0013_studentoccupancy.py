@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_occupancy(apps, schema_editor):
+    Gatepass = apps.get_model('gatepass', 'Gatepass')
+    StudentOccupancy = apps.get_model('gatepass', 'StudentOccupancy')
+    latest = {}
+    rows = Gatepass.objects.filter(
+        status='APPROVED', actual_exit_time__isnull=False, actual_entry_time__isnull=True
+    ).order_by('actual_exit_time').values_list('pk', 'student_id', 'actual_exit_time')
+    for gatepass_id, student_id, exited_at in rows:
+        latest[student_id] = (gatepass_id, exited_at)
+    StudentOccupancy.objects.bulk_create([
+        StudentOccupancy(student_id=student_id, gatepass_id=gatepass_id, exited_at=exited_at)
+        for student_id, (gatepass_id, exited_at) in latest.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0012_parent_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentOccupancy',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='occupancy', serialize=False, to='gatepass.student')),
+                ('exited_at', models.DateTimeField()),
+                ('gatepass', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='gatepass.gatepass')),
+            ],
+            options={
+                'verbose_name_plural': 'student occupancy',
+                'ordering': ['exited_at'],
+            },
+        ),
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
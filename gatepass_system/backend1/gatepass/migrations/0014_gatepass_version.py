@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0013_studentoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gatepass',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+# Audit entries never recorded the status they moved to; these actions imply it
+ACTION_STATUS = {
+    'Parent approved': 'PENDING_WARDEN',
+    'Parent rejected': 'REJECTED',
+    'Warden approved': 'APPROVED',
+    'Warden approved (override)': 'APPROVED',
+    'Warden rejected': 'REJECTED',
+    'Warden rejected (override)': 'REJECTED',
+    'EXPIRED': 'EXPIRED',
+}
+
+
+def audit_statuses(audit, current_status):
+    """
+    (old_status, new_status) for each audit entry. new_status comes from the
+    entry, its action, the next entry's old_status or, for the last entry,
+    the gatepass's current status; old_status falls back to the previous
+    entry's new_status.
+    """
+    statuses = []
+    previous = ''
+    for i, entry in enumerate(audit):
+        following = audit[i + 1] if i + 1 < len(audit) else None
+        new_status = (
+            entry.get('new_status')
+            or ACTION_STATUS.get(entry.get('action'))
+            or (following.get('old_status') if following is not None else current_status)
+            or ''
+        )
+        statuses.append((entry.get('old_status') or previous, new_status))
+        previous = new_status
+    return statuses
+
+
+def explode_audit(apps, schema_editor):
+    Gatepass = apps.get_model('gatepass', 'Gatepass')
+    GatepassEvent = apps.get_model('gatepass', 'GatepassEvent')
+    batch = []
+    rows = Gatepass.objects.exclude(audit=[]).values_list('pk', 'created_at', 'status', 'audit')
+    for gatepass_id, created_at, current_status, audit in rows.iterator(chunk_size=1000):
+        audit = audit or []
+        for entry, (old_status, new_status) in zip(audit, audit_statuses(audit, current_status)):
+            entry = dict(entry)
+            timestamp = entry.pop('timestamp', None)
+            entry.pop('old_status', None)
+            entry.pop('new_status', None)
+            batch.append(GatepassEvent(
+                gatepass_id=gatepass_id,
+                action=entry.pop('action', ''),
+                old_status=old_status,
+                new_status=new_status,
+                actor=entry.pop('user', None) or entry.pop('parent', None) or '',
+                data=entry,
+                created_at=(parse_datetime(timestamp) if timestamp else None) or created_at,
+            ))
+        if len(batch) >= 1000:
+            GatepassEvent.objects.bulk_create(batch)
+            batch = []
+    GatepassEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0014_gatepass_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GatepassEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=100)),
+                ('old_status', models.CharField(blank=True, max_length=20)),
+                ('new_status', models.CharField(blank=True, max_length=20)),
+                ('actor', models.CharField(blank=True, max_length=150)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('gatepass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='gatepass.gatepass')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['gatepass', 'created_at'], name='gatepass_event_history_idx'), models.Index(fields=['created_at'], name='gatepass_event_created_idx')],
+            },
+        ),
+        migrations.RunPython(explode_audit, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='gatepass',
+            name='audit',
+        ),
+    ]
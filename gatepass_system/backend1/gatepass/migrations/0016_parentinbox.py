@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_inbox(apps, schema_editor):
+    Gatepass = apps.get_model('gatepass', 'Gatepass')
+    ParentInbox = apps.get_model('gatepass', 'ParentInbox')
+    rows = Gatepass.objects.filter(status='PENDING_PARENT').values_list(
+        'pk', 'request_expires_at', 'student__parents__pk'
+    )
+    ParentInbox.objects.bulk_create([
+        ParentInbox(parent_id=parent_id, gatepass_id=gatepass_id, expires_at=expires_at)
+        for gatepass_id, expires_at, parent_id in rows
+        if parent_id is not None and expires_at is not None
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0015_gatepassevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParentInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField()),
+                ('gatepass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='gatepass.gatepass')),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox', to='gatepass.parent')),
+            ],
+            options={
+                'verbose_name_plural': 'parent inboxes',
+                'ordering': ['expires_at'],
+                'indexes': [models.Index(fields=['parent', 'expires_at'], name='parent_inbox_expiry_idx')],
+                'constraints': [models.UniqueConstraint(fields=('parent', 'gatepass'), name='parent_inbox_unique')],
+            },
+        ),
+        migrations.RunPython(populate_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0016_parentinbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalTokenArchive',
+            fields=[
+                ('token', models.UUIDField(primary_key=True, serialize=False)),
+                ('gatepass_id', models.UUIDField(db_index=True)),
+                ('student_roll_no', models.CharField(db_index=True, max_length=50)),
+                ('parent_id', models.IntegerField(null=True)),
+                ('parent_name', models.CharField(max_length=150)),
+                ('created_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('used_at', models.DateTimeField(blank=True, null=True)),
+                ('used', models.BooleanField(default=False)),
+                ('action_taken', models.CharField(blank=True, choices=[('approve', 'Approved'), ('reject', 'Rejected')], max_length=10, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='approvaltoken',
+            index=models.Index(fields=['used', 'action_taken', '-created_at'], name='approval_token_admin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvaltoken',
+            index=models.Index(fields=['created_at'], name='approval_token_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvaltokenarchive',
+            index=models.Index(fields=['used', 'action_taken', '-created_at'], name='token_archive_admin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvaltokenarchive',
+            index=models.Index(fields=['created_at'], name='token_archive_created_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:04
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0017_approvaltoken_indexes_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GatepassArchive',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('purpose', models.CharField(max_length=255)),
+                ('destination', models.CharField(max_length=255)),
+                ('from_time', models.DateTimeField()),
+                ('to_time', models.DateTimeField()),
+                ('status', models.CharField(choices=[('PENDING_PARENT', 'Pending Parent Approval'), ('PENDING_WARDEN', 'Pending Warden Approval'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('EXPIRED', 'Expired')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('request_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('actual_exit_time', models.DateTimeField(blank=True, null=True)),
+                ('actual_entry_time', models.DateTimeField(blank=True, null=True)),
+                ('events', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_gatepasses', to='gatepass.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at'], name='gatepass_archive_created_idx'), models.Index(fields=['student', '-created_at'], name='gatepass_archive_student_idx'), models.Index(fields=['status', '-created_at'], name='gatepass_archive_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gatepass', '0018_gatepassarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='approvaltokenarchive',
+            name='parent_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
@@ -28,6 +29,7 @@ class Student(models.Model):
 
 
 class Parent(models.Model):
+    profile = models.OneToOneField(Profile, on_delete=models.SET_NULL, null=True, blank=True)
     name = models.CharField(max_length=150)
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
@@ -57,28 +59,84 @@ class Gatepass(models.Model):
     request_expires_at = models.DateTimeField(null=True, blank=True)
     actual_exit_time = models.DateTimeField(null=True, blank=True)
     actual_entry_time = models.DateTimeField(null=True, blank=True)
-    audit = models.JSONField(default=list, blank=True)
+    # Bumped on every state transition; used for compare-and-set updates
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    is_archived = False
+
+    class Meta:
+        indexes = [
+            # Warden list ordering and dashboard queues
+            models.Index(fields=['-created_at'], name='gatepass_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='gatepass_status_created_idx'),
+            # Student history
+            models.Index(fields=['student', '-created_at'], name='gatepass_student_created_idx'),
+            # Expiry sweep
+            models.Index(fields=['status', 'request_expires_at'], name='gatepass_status_expiry_idx'),
+            models.Index(
+                fields=['request_expires_at'],
+                name='gatepass_pending_expiry_idx',
+                condition=models.Q(status='PENDING_PARENT'),
+            ),
+            # Security dashboard: students currently off campus
+            models.Index(fields=['status', 'actual_entry_time', 'actual_exit_time'], name='gatepass_status_entry_exit_idx'),
+            models.Index(
+                fields=['actual_exit_time'],
+                name='gatepass_currently_out_idx',
+                condition=models.Q(status='APPROVED', actual_exit_time__isnull=False, actual_entry_time__isnull=True),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Set request expiry if not set and status is PENDING_PARENT
         if not self.request_expires_at and self.status == "PENDING_PARENT":
             self.request_expires_at = timezone.now() + timezone.timedelta(hours=1)
+        adding = self._state.adding
         super().save(*args, **kwargs)
 
+        if adding:
+            GatepassEvent.objects.create(gatepass=self, action="Requested", new_status=self.status)
+        if self.status == "PENDING_PARENT":
+            from .expiry import note_deadline
+            note_deadline(self.request_expires_at)
+            if adding:
+                from .inbox import add
+                add(self)
+
     def send_approval_email(self):
-        from django.core.mail import send_mail
+        """
+        Create an approval token per parent and queue the approval emails in
+        the outbox. Nothing is sent until the surrounding transaction commits.
+        """
+        from django.db import transaction
+        from .notifications import enqueue_messages
+
+        with transaction.atomic():
+            enqueue_messages(self.build_approval_messages())
+
+    def build_approval_messages(self):
+        """
+        Bulk-create one approval token per parent and return the matching
+        EmailMessage objects, using a fixed number of queries per gatepass.
+        """
         from django.conf import settings
+        from django.core.mail import EmailMessage
         from django.urls import reverse
 
-        student_name = self.student.profile.user.get_full_name() or self.student.profile.user.username
-        
-        for parent in self.student.parents.all():
-            # Create approval token for each parent
-            token = ApprovalToken.objects.create(
-                gatepass=self,
-                parent=parent,
-                expires_at=self.request_expires_at
-            )
+        student = Student.objects.select_related('profile__user').prefetch_related('parents').get(pk=self.student_id)
+        student_name = student.profile.user.get_full_name() or student.profile.user.username
+        expires_at = self.request_expires_at or timezone.now() + timezone.timedelta(hours=1)
+
+        tokens = ApprovalToken.objects.bulk_create([
+            ApprovalToken(gatepass=self, parent=parent, expires_at=expires_at)
+            for parent in student.parents.all()
+        ])
+
+        messages = []
+        for token in tokens:
+            parent = token.parent
+            if not parent.email:
+                continue
             subject = f"Gatepass Request from {student_name}"
             message = f"""
 Dear {parent.name},
@@ -100,16 +158,8 @@ This approval link will expire in {timezone.timedelta(hours=1)} hours.
 Best regards,
 Gatepass System
 """
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [parent.email],
-                    fail_silently=False,
-                )
-            except Exception as e:
-                print(f"Failed to send email to {parent.email}: {str(e)}")
+            messages.append(EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [parent.email]))
+        return messages
 
     def get_status_color(self):
         return {
@@ -121,6 +171,65 @@ Gatepass System
         }.get(self.status, 'primary')
 
 
+class GatepassArchive(models.Model):
+    """
+    Closed gatepasses moved out of Gatepass by archive.archive_closed(), with
+    their event history inlined. Read through gatepass.archive, never written
+    by views.
+    """
+    id = models.UUIDField(primary_key=True)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="archived_gatepasses")
+    purpose = models.CharField(max_length=255)
+    destination = models.CharField(max_length=255)
+    from_time = models.DateTimeField()
+    to_time = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Gatepass.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    request_expires_at = models.DateTimeField(null=True, blank=True)
+    actual_exit_time = models.DateTimeField(null=True, blank=True)
+    actual_entry_time = models.DateTimeField(null=True, blank=True)
+    # GatepassEvent rows as history.stream() yields them, oldest first
+    events = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+    get_status_color = Gatepass.get_status_color
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='gatepass_archive_created_idx'),
+            models.Index(fields=['student', '-created_at'], name='gatepass_archive_student_idx'),
+            models.Index(fields=['status', '-created_at'], name='gatepass_archive_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.destination} ({self.status}, archived)"
+
+
+class GatepassEvent(models.Model):
+    """
+    Append-only history of a gatepass: requests, parent and warden
+    decisions, expiry and gate movements.
+    """
+    gatepass = models.ForeignKey(Gatepass, on_delete=models.CASCADE, related_name='events')
+    action = models.CharField(max_length=100)
+    old_status = models.CharField(max_length=20, blank=True)
+    new_status = models.CharField(max_length=20, blank=True)
+    actor = models.CharField(max_length=150, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['gatepass', 'created_at'], name='gatepass_event_history_idx'),
+            models.Index(fields=['created_at'], name='gatepass_event_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} ({self.gatepass_id})"
+
+
 class ApprovalToken(models.Model):
     token = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     gatepass = models.ForeignKey(Gatepass, on_delete=models.CASCADE, related_name='approval_tokens')
@@ -136,13 +245,18 @@ class ApprovalToken(models.Model):
         return not self.used and self.expires_at > timezone.now()
 
     def use_token(self, action):
-        if self.is_valid and action in ['approve', 'reject']:
+        if action not in ['approve', 'reject']:
+            return False
+        # Conditional update so two clicks on the same link can't both succeed
+        now = timezone.now()
+        updated = ApprovalToken.objects.filter(pk=self.pk, used=False, expires_at__gt=now).update(
+            used=True, used_at=now, action_taken=action
+        )
+        if updated:
             self.used = True
-            self.used_at = timezone.now()
+            self.used_at = now
             self.action_taken = action
-            self.save()
-            return True
-        return False
+        return bool(updated)
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -152,3 +266,104 @@ class ApprovalToken(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Admin list filters with its default newest-first ordering
+            models.Index(fields=['used', 'action_taken', '-created_at'], name='approval_token_admin_idx'),
+            # Unfiltered admin list and the archive sweep's age range
+            models.Index(fields=['created_at'], name='approval_token_created_idx'),
+        ]
+
+
+class ApprovalTokenArchive(models.Model):
+    """
+    Approval tokens past the retention window, moved out of ApprovalToken by
+    tokens.archive_stale(). Self-contained so it outlives the gatepass rows.
+    """
+    token = models.UUIDField(primary_key=True)
+    gatepass_id = models.UUIDField(db_index=True)
+    student_roll_no = models.CharField(max_length=50, db_index=True)
+    parent_id = models.BigIntegerField(null=True)
+    parent_name = models.CharField(max_length=150)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(null=True, blank=True)
+    used = models.BooleanField(default=False)
+    action_taken = models.CharField(max_length=10, choices=[('approve', 'Approved'), ('reject', 'Rejected')], null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['used', 'action_taken', '-created_at'], name='token_archive_admin_idx'),
+            models.Index(fields=['created_at'], name='token_archive_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.student_roll_no})"
+
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("SENT", "Sent"),
+        ("FAILED", "Failed"),
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.UUIDField(null=True, blank=True, editable=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
+
+
+class StudentOccupancy(models.Model):
+    """
+    Students currently off campus, kept in step with exit/entry logging.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='occupancy')
+    gatepass = models.OneToOneField(Gatepass, on_delete=models.CASCADE, related_name='occupancy')
+    exited_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['exited_at']
+        verbose_name_plural = 'student occupancy'
+
+    def __str__(self):
+        return f"{self.student} out since {self.exited_at}"
+
+
+class ParentInbox(models.Model):
+    """
+    Requests waiting on a parent, one row per (parent, gatepass), kept in
+    step with request creation, parent/warden decisions and expiry.
+    """
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE, related_name='inbox')
+    gatepass = models.ForeignKey(Gatepass, on_delete=models.CASCADE, related_name='inbox_entries')
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['expires_at']
+        constraints = [
+            models.UniqueConstraint(fields=['parent', 'gatepass'], name='parent_inbox_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['parent', 'expires_at'], name='parent_inbox_expiry_idx'),
+        ]
+        verbose_name_plural = 'parent inboxes'
+
+    def __str__(self):
+        return f"{self.gatepass_id} for {self.parent}"
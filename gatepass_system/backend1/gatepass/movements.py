@@ -0,0 +1,106 @@
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import history, occupancy
+from .models import Gatepass, GatepassEvent
+from .signals import notify_changed
+
+MAX_BATCH_SIZE = 200
+# Client clocks may run slightly ahead; anything older than a day is rejected as a typo
+MAX_CLOCK_SKEW = timezone.timedelta(minutes=5)
+MAX_BACKDATE = timezone.timedelta(days=1)
+
+
+def _timestamp(value, now):
+    if not value:
+        return now
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError("Invalid client_timestamp.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    if parsed > now + MAX_CLOCK_SKEW or parsed < now - MAX_BACKDATE:
+        raise ValueError("client_timestamp is out of range.")
+    return min(parsed, now)
+
+
+def apply_movements(items, actor=''):
+    """
+    Log a batch of exit/entry events. `items` is a list of dicts with
+    gatepass_id, action ('exit' or 'entry') and an optional client_timestamp.
+    All gatepasses are fetched with one query and every state change is a
+    conditional UPDATE in a single transaction. Returns one result dict per item.
+    """
+    now = timezone.now()
+    results = []
+    parsed = []
+    for item in items:
+        result = {'gatepass_id': item.get('gatepass_id'), 'action': item.get('action'), 'ok': False}
+        results.append(result)
+        try:
+            gatepass_id = uuid.UUID(str(item.get('gatepass_id')))
+        except ValueError:
+            result['detail'] = "Invalid gatepass id."
+            continue
+        if item.get('action') not in ('exit', 'entry'):
+            result['detail'] = "Invalid action."
+            continue
+        try:
+            at = _timestamp(item.get('client_timestamp'), now)
+        except ValueError as e:
+            result['detail'] = str(e)
+            continue
+        parsed.append((result, gatepass_id, item['action'], at))
+
+    gatepasses = Gatepass.objects.only(
+        'pk', 'student_id', 'status', 'actual_exit_time', 'actual_entry_time'
+    ).in_bulk([gatepass_id for _, gatepass_id, _, _ in parsed])
+
+    changed, students, events = defaultdict(list), set(), []
+    with transaction.atomic():
+        for result, gatepass_id, action, at in parsed:
+            gatepass = gatepasses.get(gatepass_id)
+            if gatepass is None:
+                result['detail'] = "Gatepass not found."
+                continue
+
+            if action == 'exit':
+                updated = gatepass.status == 'APPROVED' and not gatepass.actual_exit_time and Gatepass.objects.filter(
+                    pk=gatepass_id, status='APPROVED', actual_exit_time__isnull=True
+                ).update(actual_exit_time=at)
+                if updated:
+                    gatepass.actual_exit_time = at
+            else:
+                updated = gatepass.actual_exit_time and not gatepass.actual_entry_time and Gatepass.objects.filter(
+                    pk=gatepass_id, actual_exit_time__isnull=False, actual_entry_time__isnull=True
+                ).update(actual_entry_time=at)
+                if updated:
+                    gatepass.actual_entry_time = at
+
+            if updated:
+                changed[gatepass.status].append(gatepass_id)
+                students.add(gatepass.student_id)
+                events.append(GatepassEvent(
+                    gatepass_id=gatepass_id,
+                    # A movement doesn't change the status; an entry may follow a warden override
+                    **history.event(
+                        f"{action.capitalize()} logged", gatepass.status, gatepass.status, actor, at=at.isoformat()
+                    ),
+                ))
+
+            result['ok'] = bool(updated)
+            result['detail'] = f"{action.capitalize()} time logged." if updated else "Invalid action or state."
+
+        # Recompute rather than patch the rows: a student may have several passes
+        # out, and an entry on one of them leaves the student out on another
+        if students:
+            occupancy.refresh_students(students)
+        GatepassEvent.objects.bulk_create(events)
+
+        for status, gatepass_ids in changed.items():
+            notify_changed(gatepass_ids, status)
+    return results
@@ -0,0 +1,122 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+MAX_ATTEMPTS = getattr(settings, 'GATEPASS_OUTBOX_MAX_ATTEMPTS', 5)
+RETRY_BASE_SECONDS = getattr(settings, 'GATEPASS_OUTBOX_RETRY_BASE_SECONDS', 30)
+# A claimed batch is handed to another dispatcher if it is not finished within this time
+CLAIM_LEASE_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gatepass-outbox')
+
+
+def enqueue_messages(messages):
+    """
+    Store EmailMessage objects in the outbox with a single INSERT. They are
+    delivered after the surrounding transaction commits, either in-process
+    or by the dispatch_outbox command.
+    """
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(to=to, subject=message.subject, body=message.body)
+        for message in messages
+        for to in message.to
+    ])
+    if emails:
+        transaction.on_commit(kick)
+    return emails
+
+
+def kick():
+    if getattr(settings, 'GATEPASS_OUTBOX_DISPATCH_IN_PROCESS', True):
+        _executor.submit(_dispatch_in_background)
+
+
+def _dispatch_in_background():
+    close_old_connections()
+    try:
+        dispatch_pending()
+    except Exception:
+        logger.exception('Outbox dispatch failed')
+    finally:
+        close_old_connections()
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    due = OutboundEmail.objects.filter(status='PENDING', next_attempt_at__lte=now)
+    ids = list(due.values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    # Conditional update so concurrent dispatchers never claim the same row
+    claim = uuid.uuid4()
+    due.filter(pk__in=ids).update(
+        claim=claim,
+        next_attempt_at=now + timezone.timedelta(seconds=CLAIM_LEASE_SECONDS),
+    )
+    return list(OutboundEmail.objects.filter(claim=claim))
+
+
+def dispatch_pending(batch_size=100):
+    """
+    Send due outbox emails over a single SMTP connection. Returns a
+    (sent, failed) tuple for the batch.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent_ids = []
+    failed = 0
+    connection = get_connection(fail_silently=False)
+    messages = [
+        EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to], connection=connection)
+        for email in batch
+    ]
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            _record_failure(email, e)
+        return 0, len(batch)
+
+    try:
+        # One message per send_messages call on the shared connection, so a
+        # single rejected address does not resend the rest of the batch
+        for email, message in zip(batch, messages):
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(email, e)
+                failed += 1
+            else:
+                sent_ids.append(email.pk)
+    finally:
+        connection.close()
+
+    OutboundEmail.objects.filter(pk__in=sent_ids).update(
+        status='SENT', sent_at=timezone.now(), attempts=F('attempts') + 1, claim=None,
+    )
+    return len(sent_ids), failed
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.claim = None
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'FAILED'
+    else:
+        backoff = RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+        email.next_attempt_at = timezone.now() + timezone.timedelta(seconds=backoff)
+    email.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'next_attempt_at'])
@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from .models import Gatepass, StudentOccupancy
+from .stats import CURRENTLY_OUT
+
+
+def refresh(gatepass_id):
+    """
+    Re-derive the occupancy row of one gatepass's student, as rebuild() does
+    for everyone. Needed when a warden override moves a pass that is already
+    out into or out of APPROVED.
+    """
+    student_id = Gatepass.objects.filter(pk=gatepass_id).values_list('student_id', flat=True).first()
+    refresh_students([student_id])
+
+
+def refresh_students(student_ids):
+    """
+    Re-derive the occupancy rows of `student_ids` from their open passes, so
+    an entry on one pass falls back to another pass that is still out.
+    """
+    student_ids = set(student_ids)
+    latest = {}
+    rows = Gatepass.objects.filter(CURRENTLY_OUT, student_id__in=student_ids).order_by('actual_exit_time').values_list(
+        'pk', 'student_id', 'actual_exit_time'
+    )
+    for gatepass_id, student_id, exited_at in rows:
+        latest[student_id] = (gatepass_id, exited_at)
+
+    StudentOccupancy.objects.filter(student_id__in=student_ids - latest.keys()).delete()
+    if latest:
+        StudentOccupancy.objects.bulk_create(
+            [StudentOccupancy(student_id=student_id, gatepass_id=gatepass_id, exited_at=exited_at)
+             for student_id, (gatepass_id, exited_at) in latest.items()],
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['gatepass', 'exited_at'],
+        )
+
+
+def is_out(student_id):
+    return StudentOccupancy.objects.filter(pk=student_id).exists()
+
+
+def students_out():
+    return StudentOccupancy.objects.select_related('student__profile__user', 'gatepass')
+
+
+def headcount():
+    return StudentOccupancy.objects.count()
+
+
+def rebuild():
+    """
+    Rebuild the occupancy table from Gatepass history. Returns the number
+    of students currently out.
+    """
+    latest = {}
+    rows = Gatepass.objects.filter(CURRENTLY_OUT).order_by('actual_exit_time').values_list(
+        'pk', 'student_id', 'actual_exit_time'
+    )
+    for gatepass_id, student_id, exited_at in rows.iterator():
+        # A student with several open passes is counted once, on the latest exit
+        latest[student_id] = (gatepass_id, exited_at)
+
+    with transaction.atomic():
+        StudentOccupancy.objects.all().delete()
+        StudentOccupancy.objects.bulk_create([
+            StudentOccupancy(student_id=student_id, gatepass_id=gatepass_id, exited_at=exited_at)
+            for student_id, (gatepass_id, exited_at) in latest.items()
+        ], batch_size=1000)
+    return len(latest)
@@ -1,51 +1,49 @@
 from django.views import View
-from django.views.generic import ListView
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.urls import reverse
-from .models import ApprovalToken, Gatepass, Parent
+from .models import ApprovalToken, Gatepass, Parent, Student
 from django.core.exceptions import PermissionDenied
+from . import archive, history, inbox
+from .pagination import InvalidCursor
+from .principal import get_principal
+from .transitions import TransitionConflict, transition
 
-class ParentDashboardView(LoginRequiredMixin, ListView):
-    model = Gatepass
-    template_name = 'gatepass/parent_dashboard.html'
-    context_object_name = 'gatepasses'
-    paginate_by = 10
+class ParentDashboardView(LoginRequiredMixin, View):
+    page_size = 10
 
-    def get_queryset(self):
+    def get(self, request):
+        principal = get_principal(request)
+        if not principal.is_parent:
+            return redirect('login')
+        cursor = request.GET.get('cursor')
         try:
-            parent = Parent.objects.get(profile=self.request.user.profile)
-            return Gatepass.objects.filter(
-                student__in=parent.students.all()
-            ).order_by('-created_at')
-        except Parent.DoesNotExist:
-            return Gatepass.objects.none()
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        try:
-            parent = Parent.objects.get(profile=self.request.user.profile)
-            context['pending_requests'] = Gatepass.objects.filter(
-                student__in=parent.students.all(),
-                status='PENDING_PARENT'
-            ).order_by('request_expires_at')
-            context['children'] = parent.students.all()
-        except Parent.DoesNotExist:
-            context['pending_requests'] = []
-            context['children'] = []
-        return context
+            gatepasses, next_cursor = archive.page(cursor, self.page_size, student__parents=principal.parent_id)
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return render(request, 'gatepass/parent_dashboard.html', {
+            # One range read of the parent's inbox, already sorted by expiry
+            'pending_requests': inbox.pending(principal.parent_id),
+            'children': Student.objects.filter(parents=principal.parent_id).select_related('profile__user'),
+            'gatepasses': gatepasses,
+            'next_cursor': next_cursor,
+            'is_first_page': not cursor,
+        })
 
 class ParentApprovalView(LoginRequiredMixin, View):
     def post(self, request, gatepass_id):
         try:
-            parent = Parent.objects.get(profile=request.user.profile)
+            principal = get_principal(request)
+            if not principal.is_parent:
+                raise Parent.DoesNotExist
+            parent = Parent.objects.only('name').get(pk=principal.parent_id)
             gatepass = get_object_or_404(Gatepass, id=gatepass_id)
-            
+
             # Verify this parent has authority over this student
-            if gatepass.student not in parent.students.all():
+            if not Student.parents.through.objects.filter(student_id=gatepass.student_id, parent_id=parent.pk).exists():
                 raise PermissionDenied("You don't have permission to approve this request")
             
             action = request.POST.get('action')
@@ -55,21 +53,27 @@ class ParentApprovalView(LoginRequiredMixin, View):
                     'message': 'Invalid action'
                 }, status=400)
 
-            if gatepass.status != 'PENDING_PARENT':
-                return JsonResponse({
-                    'success': False,
-                    'message': 'This request is no longer pending parent approval'
-                }, status=400)
-
             if action == 'approve':
-                gatepass.status = 'PENDING_WARDEN'
+                new_status = 'PENDING_WARDEN'
                 message = 'Request approved and sent to warden'
             else:
-                gatepass.status = 'REJECTED'
+                new_status = 'REJECTED'
                 message = 'Request rejected'
 
-            gatepass.save()
-            
+            try:
+                transition(
+                    gatepass.pk,
+                    ['PENDING_PARENT'],
+                    new_status,
+                    event=history.event(f"Parent {action}d", actor=parent.name),
+                )
+            except TransitionConflict:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'This request is no longer pending parent approval'
+                }, status=400)
+            gatepass.status = new_status
+
             return JsonResponse({
                 'success': True,
                 'message': message,
@@ -0,0 +1,107 @@
+import logging
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+SALT = 'gatepass.pass'
+# Leeway for guard terminals whose clocks drift from the server
+CLOCK_SKEW_SECONDS = getattr(settings, 'GATEPASS_PASS_CLOCK_SKEW_SECONDS', 300)
+# How long the state of an approved or revoked gatepass is kept for scans
+STATE_TTL = getattr(settings, 'GATEPASS_PASS_STATE_TTL_SECONDS', 60 * 60 * 24 * 7)
+
+logger = logging.getLogger(__name__)
+
+
+def _signing_key():
+    return getattr(settings, 'GATEPASS_PASS_SIGNING_KEY', None)
+
+
+def issue(gatepass):
+    """
+    Return a compact signed token for an approved gatepass. The payload is
+    readable (base64 JSON) but tamper-proof. It carries the gatepass version,
+    which every state transition bumps, so a pass stops verifying as soon as
+    the gatepass's state in the shared cache moves past it.
+    """
+    user = gatepass.student.profile.user if gatepass.student.profile else None
+    payload = {
+        'g': gatepass.pk.hex,
+        's': gatepass.student_id,
+        'r': gatepass.student.roll_no,
+        'n': (user.get_full_name() or user.username) if user else '',
+        'f': int(gatepass.from_time.timestamp()),
+        't': int(gatepass.to_time.timestamp()),
+        'v': gatepass.version,
+    }
+    return signing.dumps(payload, key=_signing_key(), salt=SALT, compress=True)
+
+
+def _state_key(gatepass_hex):
+    return f'gatepass:pass:{gatepass_hex}'
+
+
+def record_state(gatepass_id, status, version):
+    """
+    Store a gatepass's (status, version) in the shared cache for verify().
+    Called after commit by transition() whenever a gatepass enters or leaves
+    APPROVED. A write that lost a race to a newer version is ignored.
+    """
+    key = _state_key(uuid.UUID(str(gatepass_id)).hex)
+    stored = cache.get(key)
+    if stored is None or stored[1] < version:
+        cache.set(key, (status, version), STATE_TTL)
+
+
+def revocation_state(gatepass_hex, version):
+    """
+    True if the pass was revoked, False if the gatepass is still APPROVED at
+    the version the pass was issued for, or None when the cache has no
+    record or cannot be reached.
+    """
+    try:
+        stored = cache.get(_state_key(gatepass_hex))
+    except Exception:
+        logger.warning('Pass revocation cache unreachable', exc_info=True)
+        return None
+    if stored is None:
+        return None
+    return stored != ('APPROVED', version)
+
+
+def verify(token, now=None):
+    """
+    Verify a signed pass without touching the database. Returns a dict with
+    `valid`, `reason`, `checked` and the decoded pass details. `checked` is
+    False when revocation could not be looked up in the cache; the verdict
+    then rests on the signature and validity window alone.
+    """
+    try:
+        payload = signing.loads(token, key=_signing_key(), salt=SALT)
+    except signing.BadSignature:
+        return {'valid': False, 'reason': 'bad_signature', 'checked': True, 'pass': None}
+
+    now = (now or timezone.now()).timestamp()
+    details = {
+        'id': str(uuid.UUID(payload['g'])),
+        'student': payload['s'],
+        'roll_no': payload['r'],
+        'name': payload['n'],
+        'from_time': datetime.fromtimestamp(payload['f'], tz=dt_timezone.utc).isoformat(),
+        'to_time': datetime.fromtimestamp(payload['t'], tz=dt_timezone.utc).isoformat(),
+    }
+
+    revoked = revocation_state(payload['g'], payload.get('v'))
+    if revoked:
+        reason = 'revoked'
+    elif now < payload['f'] - CLOCK_SKEW_SECONDS:
+        reason = 'not_yet_valid'
+    elif now > payload['t'] + CLOCK_SKEW_SECONDS:
+        reason = 'expired'
+    else:
+        reason = None
+    return {'valid': reason is None, 'reason': reason, 'checked': revoked is not None, 'pass': details}
+
@@ -0,0 +1,223 @@
+import uuid
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from . import metrics
+from .models import Profile, Student, Parent
+
+SESSION_KEY = '_gatepass_principal'
+
+
+class Principal:
+    """
+    The resolved identity of the current user: role plus the student/parent
+    record it maps to. Resolved once and cached in the session or JWT claims
+    so permission checks and templates don't query Profile on every request.
+    """
+    FIELDS = ('user_id', 'username', 'role', 'profile_id', 'student_id', 'parent_id', 'version')
+
+    def __init__(self, user_id=None, username='', role=None, profile_id=None,
+                 student_id=None, parent_id=None, version=None):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.profile_id = profile_id
+        self.student_id = student_id
+        self.parent_id = parent_id
+        self.version = version
+
+    @property
+    def is_student(self):
+        return self.role == 'STUDENT' and self.student_id is not None
+
+    @property
+    def is_parent(self):
+        return self.role == 'PARENT' and self.parent_id is not None
+
+    @property
+    def is_warden(self):
+        return self.role == 'WARDEN'
+
+    @property
+    def is_security(self):
+        return self.role == 'SECURITY'
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.FIELDS})
+
+
+ANONYMOUS = Principal()
+
+
+def _version_key(user_id):
+    return f'gatepass:principal-version:{user_id}'
+
+
+def current_version(user_id):
+    """
+    The user's principal version from the shared cache. If the key is missing
+    (never set, evicted or cleared) a fresh version is created, so principals
+    cached under the lost one no longer match and are reloaded.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_principal(user_id):
+    """Force every cached principal for this user to be reloaded."""
+    cache.set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def load_principal(user):
+    # Read the version first: a change committed after this read bumps it and
+    # forces another reload, rather than being cached under the new version
+    version = current_version(user.pk)
+    profile = (
+        Profile.objects.select_related('student', 'parent')
+        .filter(user_id=user.pk)
+        .first()
+    )
+    if profile is None:
+        return Principal(user_id=user.pk, username=user.get_username(), version=version)
+    return Principal(
+        user_id=user.pk,
+        username=user.get_username(),
+        role=profile.user_type,
+        profile_id=profile.pk,
+        student_id=getattr(getattr(profile, 'student', None), 'pk', None),
+        parent_id=getattr(getattr(profile, 'parent', None), 'pk', None),
+        version=version,
+    )
+
+
+def _from_claims(auth):
+    # JWT access tokens issued by PrincipalTokenObtainPairSerializer carry the principal
+    try:
+        claims = auth.payload
+    except AttributeError:
+        return None
+    if 'role' not in claims:
+        return None
+    return Principal(
+        user_id=claims.get('user_id'),
+        username=claims.get('username', ''),
+        role=claims['role'],
+        profile_id=claims.get('profile_id'),
+        student_id=claims.get('student_id'),
+        parent_id=claims.get('parent_id'),
+        version=claims.get('version'),
+    )
+
+
+def _is_current(principal, user_id):
+    return (
+        principal.user_id == user_id
+        and principal.version is not None
+        and principal.version == current_version(user_id)
+    )
+
+
+def store_principal(request, principal):
+    request.session[SESSION_KEY] = principal.to_dict()
+
+
+def get_principal(request):
+    """
+    Return the Principal for request.user, loading it at most once per
+    request and, for session users, once per session until invalidated.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+
+    cached = getattr(request, '_gatepass_principal', None)
+    if cached is not None and cached.user_id == user.pk:
+        return cached
+
+    principal = _from_claims(getattr(request, 'auth', None))
+    if principal is not None:
+        # Claims are only trusted until the user's role or links change;
+        # after that the token's principal is reloaded until it is refreshed
+        if _is_current(principal, user.pk):
+            metrics.cache_hit('principal')
+        else:
+            metrics.cache_miss('principal')
+            principal = load_principal(user)
+    else:
+        session = getattr(request, 'session', None)
+        data = session.get(SESSION_KEY) if session is not None else None
+        if data and _is_current(Principal.from_dict(data), user.pk):
+            metrics.cache_hit('principal')
+            principal = Principal.from_dict(data)
+        else:
+            metrics.cache_miss('principal')
+            principal = load_principal(user)
+            if session is not None:
+                store_principal(request, principal)
+
+    # DRF wraps the Django request; cache on the underlying request so both see it
+    getattr(request, '_request', request)._gatepass_principal = principal
+    return principal
+
+
+class PrincipalTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        principal = load_principal(user)
+        token['username'] = principal.username
+        token['role'] = principal.role
+        token['profile_id'] = principal.profile_id
+        token['student_id'] = principal.student_id
+        token['parent_id'] = principal.parent_id
+        token['version'] = principal.version
+        return token
+
+
+class PrincipalMiddleware:
+    """
+    Exposes the resolved principal as request.principal.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = _LazyPrincipal(request)
+        return self.get_response(request)
+
+
+class _LazyPrincipal:
+    # Resolved on attribute access so DRF authentication (JWT) has run first
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(get_principal(self._request), name)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def _profile_changed(sender, instance, **kwargs):
+    invalidate_principal(instance.user_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Parent)
+@receiver(post_delete, sender=Parent)
+def _linked_record_changed(sender, instance, **kwargs):
+    if instance.profile_id:
+        user_id = Profile.objects.filter(pk=instance.profile_id).values_list('user_id', flat=True).first()
+        if user_id:
+            invalidate_principal(user_id)
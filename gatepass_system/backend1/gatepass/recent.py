@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.dispatch import receiver
+
+from .models import Gatepass
+from .signals import gatepass_changed
+
+# Name of the {% cache %} fragment in student_request.html
+FRAGMENT_NAME = 'recent_requests'
+CACHE_TTL = getattr(settings, 'GATEPASS_RECENT_REQUESTS_TTL_SECONDS', 60 * 15)
+RECENT_COUNT = 5
+# Keeps the student lookup for large expiry sweeps under the database's parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+
+def recent_requests(student_id):
+    """
+    A student's latest requests. Lazy, so it is only evaluated when the
+    cached fragment has to be re-rendered.
+    """
+    return Gatepass.objects.filter(student_id=student_id).order_by('-created_at')[:RECENT_COUNT]
+
+
+def invalidate(student_ids):
+    cache.delete_many([make_template_fragment_key(FRAGMENT_NAME, [student_id]) for student_id in student_ids])
+
+
+@receiver(gatepass_changed)
+def _gatepass_changed(sender, gatepass_ids, **kwargs):
+    # New requests and status changes both show up in the fragment
+    for start in range(0, len(gatepass_ids), LOOKUP_BATCH_SIZE):
+        invalidate(set(
+            Gatepass.objects.filter(pk__in=gatepass_ids[start:start + LOOKUP_BATCH_SIZE])
+            .values_list('student_id', flat=True)
+        ))
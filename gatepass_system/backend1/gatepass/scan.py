@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+
+from . import metrics
+from .models import Gatepass
+from .signals import gatepass_changed
+
+CACHE_TTL = getattr(settings, 'GATEPASS_SCAN_CARD_TTL_SECONDS', 60 * 15)
+
+
+def cache_key(gatepass_id):
+    return f'gatepass:scan:{gatepass_id}'
+
+
+def build_card(gatepass):
+    """
+    The minimal view of a gatepass that a guard needs at the gate.
+    """
+    user = gatepass.student.profile.user if gatepass.student.profile else None
+    if gatepass.actual_entry_time:
+        state = 'RETURNED'
+    elif gatepass.actual_exit_time:
+        state = 'OUT'
+    else:
+        state = 'NOT_EXITED'
+    return {
+        'id': str(gatepass.pk),
+        'name': (user.get_full_name() or user.username) if user else '',
+        'roll_no': gatepass.student.roll_no,
+        'status': gatepass.status,
+        'from_time': gatepass.from_time.isoformat(),
+        'to_time': gatepass.to_time.isoformat(),
+        'state': state,
+        'exit_time': gatepass.actual_exit_time.isoformat() if gatepass.actual_exit_time else None,
+        'entry_time': gatepass.actual_entry_time.isoformat() if gatepass.actual_entry_time else None,
+    }
+
+
+def _load(gatepass_ids):
+    return Gatepass.objects.select_related('student__profile__user').filter(pk__in=gatepass_ids)
+
+
+def warm(gatepass_ids):
+    cache.set_many({cache_key(gatepass.pk): build_card(gatepass) for gatepass in _load(gatepass_ids)}, CACHE_TTL)
+
+
+def get_card(gatepass_id):
+    """
+    Return the scan card for a gatepass from cache, loading it on a miss.
+    Returns None for unknown gatepasses.
+    """
+    card = cache.get(cache_key(gatepass_id))
+    if card is not None:
+        metrics.cache_hit('scan_card')
+    else:
+        metrics.cache_miss('scan_card')
+        gatepass = _load([gatepass_id]).first()
+        if gatepass is None:
+            return None
+        card = build_card(gatepass)
+        cache.set(cache_key(gatepass_id), card, CACHE_TTL)
+    return card
+
+
+@receiver(gatepass_changed)
+def _gatepass_changed(sender, gatepass_ids, status=None, **kwargs):
+    # Approved passes are what guards scan, so rebuild their cards eagerly
+    if status == 'APPROVED':
+        warm(gatepass_ids)
+    else:
+        cache.delete_many([cache_key(gatepass_id) for gatepass_id in gatepass_ids])
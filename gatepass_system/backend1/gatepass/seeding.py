@@ -0,0 +1,75 @@
+"""
+Bulk creation of synthetic accounts for benchmarks, load tests and query
+plan checks. Every row is named after a prefix so remove() can take it out
+again. remove() only runs against a scratch database (no accounts outside
+the prefix) unless forced, so a benchmark pointed at the live database
+can't delete real users that happen to share the prefix.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Profile, Student, Parent, Gatepass, OutboundEmail, StudentOccupancy
+
+EMAIL_DOMAIN = 'example.invalid'
+BATCH_SIZE = 1000
+
+
+class SeedingError(Exception):
+    pass
+
+
+def create_accounts(usernames, user_type, password='', batch_size=BATCH_SIZE):
+    """Bulk-create users with profiles of `user_type`. Returns the profiles, with `user` set."""
+    users = User.objects.bulk_create([User(username=name, password=password) for name in usernames], batch_size=batch_size)
+    return Profile.objects.bulk_create([Profile(user=user, user_type=user_type) for user in users], batch_size=batch_size)
+
+
+def create_students(prefix, start, end, parents_per_student=0, password='', batch_size=BATCH_SIZE):
+    """
+    Bulk-create students [start, end) with their accounts and
+    `parents_per_student` parents each. Returns (students, parent_ids), where
+    parent_ids maps each student's pk to its parents' pks. Pass a password
+    hashed once with make_password(); hashing per user dominates otherwise.
+    """
+    with transaction.atomic():
+        profiles = create_accounts(
+            [f'{prefix}student{i}' for i in range(start, end)], 'STUDENT', password, batch_size,
+        )
+        students = Student.objects.bulk_create([
+            Student(profile=profile, roll_no=f'{prefix}{i}') for i, profile in zip(range(start, end), profiles)
+        ], batch_size=batch_size)
+        parents = Parent.objects.bulk_create([
+            Parent(name=f'{prefix}parent{i}.{j}', email=f'{prefix}parent{i}.{j}@{EMAIL_DOMAIN}')
+            for i in range(start, end)
+            for j in range(parents_per_student)
+        ], batch_size=batch_size)
+        Student.parents.through.objects.bulk_create([
+            Student.parents.through(student_id=student.pk, parent_id=parents[k * parents_per_student + j].pk)
+            for k, student in enumerate(students)
+            for j in range(parents_per_student)
+        ], batch_size=batch_size)
+    parent_ids = {
+        student.pk: [parents[k * parents_per_student + j].pk for j in range(parents_per_student)]
+        for k, student in enumerate(students)
+    }
+    return students, parent_ids
+
+
+def check_scratch_database(prefix):
+    if User.objects.exclude(username__startswith=prefix).exists():
+        raise SeedingError(
+            f'The database has accounts not named "{prefix}*"; refusing to delete seeded rows from what '
+            f'looks like a live database. Use a scratch database or force it.'
+        )
+
+
+def remove(prefix, force=False):
+    """Delete everything create_students()/create_accounts() made with `prefix`."""
+    if not force:
+        check_scratch_database(prefix)
+    students = Student.objects.filter(roll_no__startswith=prefix)
+    StudentOccupancy.objects.filter(student__in=students).delete()
+    Gatepass.objects.filter(student__in=students).delete()
+    Parent.objects.filter(name__startswith=prefix).delete()
+    OutboundEmail.objects.filter(to__startswith=prefix, to__endswith=f'@{EMAIL_DOMAIN}').delete()
+    User.objects.filter(username__startswith=prefix).delete()
@@ -1,5 +1,19 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Student, Parent, Gatepass, ApprovalToken
+from .models import Student, Parent, Gatepass, ApprovalToken, ApprovalTokenArchive, GatepassArchive
+
+class DynamicFieldsMixin:
+    """
+    Restricts the serialized fields to those named in the ?fields= query parameter.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request is not None else None
+        if requested:
+            allowed = {name.strip() for name in requested.split(',')}
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
 
 class ParentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,10 +34,82 @@ class ApprovalTokenSerializer(serializers.ModelSerializer):
         model = ApprovalToken
         fields = ['token', 'gatepass', 'parent', 'created_at', 'expires_at', 'used', 'action_taken']
 
-class GatepassSerializer(serializers.ModelSerializer):
+class ArchivedApprovalTokenSerializer(serializers.ModelSerializer):
+    """ApprovalTokenSerializer's shape for tokens in the token archive."""
+    gatepass = serializers.UUIDField(source='gatepass_id', read_only=True)
+    parent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ApprovalTokenArchive
+        fields = ['token', 'gatepass', 'parent', 'created_at', 'expires_at', 'used', 'action_taken']
+
+    def get_parent(self, token):
+        return {'id': token.parent_id, 'name': token.parent_name}
+
+class GatepassArchiveSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    GatepassSerializer's shape for archived gatepasses. Approval tokens come
+    from archive.attach_tokens(), or one query per row without it.
+    """
+    student = StudentSerializer(read_only=True)
+    approval_tokens = serializers.SerializerMethodField()
+    version = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GatepassArchive
+        fields = [
+            'id', 'student', 'approval_tokens', 'purpose', 'destination', 'from_time', 'to_time', 'status',
+            'created_at', 'request_expires_at', 'actual_exit_time', 'actual_entry_time', 'version',
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('student').prefetch_related(
+            Prefetch('student__parents', queryset=Parent.objects.all()),
+        )
+
+    def get_approval_tokens(self, gatepass):
+        tokens = getattr(gatepass, 'archived_tokens', None)
+        if tokens is None:
+            tokens = ApprovalTokenArchive.objects.filter(gatepass_id=gatepass.pk)
+        return ArchivedApprovalTokenSerializer(tokens, many=True).data
+
+    def get_version(self, gatepass):
+        # Archived gatepasses can no longer change
+        return None
+
+class GatepassSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
     approval_tokens = ApprovalTokenSerializer(many=True, read_only=True)
 
     class Meta:
         model = Gatepass
         fields = "__all__"
+
+    def to_representation(self, instance):
+        if instance.is_archived:
+            return GatepassArchiveSerializer(instance, context=self.context).data
+        return super().to_representation(instance)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Load the nested student parents and approval token parents in a fixed number of queries
+        return queryset.select_related('student').prefetch_related(
+            Prefetch('student__parents', queryset=Parent.objects.all()),
+            Prefetch('approval_tokens', queryset=ApprovalToken.objects.select_related('parent')),
+        )
+
+class GatepassListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Compact gatepass representation for list endpoints, without nested
+    parent and approval token records. Serializes archived gatepasses too.
+    """
+    roll_no = serializers.CharField(source='student.roll_no', read_only=True)
+
+    class Meta:
+        model = Gatepass
+        fields = [
+            'id', 'student', 'roll_no', 'purpose', 'destination', 'from_time', 'to_time', 'status',
+            'created_at', 'request_expires_at', 'actual_exit_time', 'actual_entry_time',
+        ]
+        read_only_fields = ['student', 'status', 'created_at', 'request_expires_at', 'actual_exit_time', 'actual_entry_time']
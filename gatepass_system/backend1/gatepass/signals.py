@@ -0,0 +1,36 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Gatepass
+
+# Sent after commit whenever gatepasses are created or change state.
+# Receivers get `gatepass_ids` (a list of ids) and `status` (the new status,
+# or None when it is not known to the sender).
+gatepass_changed = Signal()
+
+logger = logging.getLogger(__name__)
+
+
+def notify_changed(gatepass_ids, status=None):
+    gatepass_ids = list(gatepass_ids)
+    if gatepass_ids:
+        transaction.on_commit(lambda: _send_changed(gatepass_ids, status))
+
+
+def _send_changed(gatepass_ids, status):
+    # The change is already committed; a failing receiver (e.g. cache warming)
+    # must not surface as an error to the caller, who would retry it
+    for handler, result in gatepass_changed.send_robust(sender=Gatepass, gatepass_ids=gatepass_ids, status=status):
+        if isinstance(result, Exception):
+            logger.error(
+                'gatepass_changed receiver %s.%s failed', handler.__module__, handler.__qualname__,
+                exc_info=result,
+            )
+
+
+@receiver(post_save, sender=Gatepass)
+def _gatepass_saved(sender, instance, **kwargs):
+    notify_changed([instance.pk], instance.status)
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .models import Gatepass
+from .signals import gatepass_changed
+
+CACHE_KEY = 'gatepass:stats'
+CACHE_TTL = getattr(settings, 'GATEPASS_STATS_TTL_SECONDS', 10)
+
+CURRENTLY_OUT = Q(status='APPROVED', actual_exit_time__isnull=False, actual_entry_time__isnull=True)
+
+
+def compute_counters(now=None):
+    """
+    All dashboard counters in a single conditional-aggregation query.
+    """
+    now = timezone.localtime(now or timezone.now())
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timezone.timedelta(days=1)
+
+    return Gatepass.objects.aggregate(
+        pending_parent=Count('pk', filter=Q(status='PENDING_PARENT')),
+        pending_warden=Count('pk', filter=Q(status='PENDING_WARDEN')),
+        approved=Count('pk', filter=Q(status='APPROVED')),
+        rejected=Count('pk', filter=Q(status='REJECTED')),
+        expired=Count('pk', filter=Q(status='EXPIRED')),
+        students_out=Count('pk', filter=CURRENTLY_OUT),
+        expected_returns=Count('pk', filter=CURRENTLY_OUT & Q(to_time__gte=day_start, to_time__lt=day_end)),
+        pending_verifications=Count('pk', filter=Q(status='APPROVED', actual_exit_time__isnull=True)),
+    )
+
+
+def get_counters():
+    """
+    Cached snapshot of compute_counters(), refreshed after CACHE_TTL seconds
+    or as soon as any gatepass changes state.
+    """
+    counters = cache.get(CACHE_KEY)
+    if counters is None:
+        metrics.cache_miss('stats')
+        counters = compute_counters()
+        cache.set(CACHE_KEY, counters, CACHE_TTL)
+    else:
+        metrics.cache_hit('stats')
+    return counters
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+@receiver(gatepass_changed)
+def _gatepass_changed(sender, **kwargs):
+    invalidate()
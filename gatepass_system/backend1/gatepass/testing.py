@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner on a per-process locmem cache, so tests never share the
+    development cache. Runners other than `manage.py test` get the same by
+    setting GATEPASS_TESTING=1.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = None
+        if not settings.TESTING:
+            self._caches = override_settings(CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'OPTIONS': {'MAX_ENTRIES': 10000},
+                },
+            })
+            self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        if self._caches is not None:
+            self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1241 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from backend import settings as project_settings
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (archive, benchmark, history, inbox, live, metrics, movements, notifications, occupancy, passes, scan,
+               seeding, signals, stats, tokens)
+from .expiry import ExpiryTracker, tracker
+from .management.commands import expire_gatepasses
+from .models import (Profile, Student, Parent, Gatepass, ApprovalToken, GatepassEvent, ParentInbox,
+                     StudentOccupancy, ApprovalTokenArchive, GatepassArchive, OutboundEmail)
+from .transitions import TransitionConflict, transition
+
+
+def create_user(username, user_type):
+    user = User.objects.create_user(username=username, password='test1234')
+    profile = Profile.objects.create(user=user, user_type=user_type)
+    return user, profile
+
+
+def create_students(count, parents_per_student=2):
+    students = []
+    offset = Student.objects.count()
+    for i in range(offset, offset + count):
+        _, profile = create_user(f'student{i}', 'STUDENT')
+        student = Student.objects.create(profile=profile, roll_no=f'S{i:03d}')
+        student.parents.set(Parent.objects.bulk_create([
+            Parent(name=f'Parent {i}.{j}', email=f'parent{i}.{j}@test.com') for j in range(parents_per_student)
+        ]))
+        students.append(student)
+    return students
+
+
+def create_gatepasses(students, count):
+    """Bulk-create `count` gatepasses spread over `students`, each with approval tokens."""
+    now = timezone.now()
+    gatepasses = Gatepass.objects.bulk_create([
+        Gatepass(
+            student=students[i % len(students)],
+            purpose='Home visit',
+            destination='Home',
+            from_time=now,
+            to_time=now + timezone.timedelta(hours=4),
+            request_expires_at=now + timezone.timedelta(hours=1),
+        )
+        for i in range(count)
+    ])
+    parents = {student.pk: list(student.parents.all()) for student in students}
+    ApprovalToken.objects.bulk_create([
+        ApprovalToken(gatepass=gatepass, parent=parent, expires_at=gatepass.request_expires_at)
+        for gatepass in gatepasses
+        for parent in parents[gatepass.student_id]
+    ])
+    return gatepasses
+
+
+class ExpiryTrackerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.gatepasses = create_gatepasses(create_students(1), 3)
+        inbox.rebuild()
+        self.assertEqual(ParentInbox.objects.count(), 6)
+        self.tracker = ExpiryTracker(recheck_seconds=60)
+        # Reads the earliest deadline, an hour away, and trusts it for a minute
+        self.assertEqual(self.tracker.expire_due(self.now), 0)
+
+    def set_deadline(self, gatepass, seconds):
+        deadline = self.now + timezone.timedelta(seconds=seconds)
+        Gatepass.objects.filter(pk=gatepass.pk).update(request_expires_at=deadline)
+        return deadline
+
+    def later(self, seconds):
+        return self.now + timezone.timedelta(seconds=seconds)
+
+    def test_no_queries_before_the_cached_deadline(self):
+        self.assertEqual(self.tracker.next_expiry, min(gatepass.request_expires_at for gatepass in self.gatepasses))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tracker.expire_due(self.later(30)), 0)
+
+    def test_note_deadline_pulls_the_deadline_earlier(self):
+        deadline = self.set_deadline(self.gatepasses[0], 10)
+        self.tracker.note_deadline(deadline)
+        self.tracker.note_deadline(self.later(3600 * 2))
+        self.assertEqual(self.tracker.next_expiry, deadline)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tracker.expire_due(self.later(5)), 0)
+        self.assertEqual(self.tracker.expire_due(self.later(11)), 1)
+
+    def test_recheck_finds_deadlines_from_other_processes(self):
+        # Written by another worker, so this tracker was never told
+        self.set_deadline(self.gatepasses[0], 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tracker.expire_due(self.later(30)), 0)
+        self.assertEqual(self.tracker.expire_due(self.later(61)), 1)
+        self.assertEqual(Gatepass.objects.get(pk=self.gatepasses[0].pk).status, 'EXPIRED')
+
+    def test_expire_command_with_interval(self):
+        class Stop(Exception):
+            pass
+
+        sleeps = []
+
+        class FakeTime:
+            @staticmethod
+            def sleep(seconds):
+                sleeps.append(seconds)
+                if len(sleeps) == 1:
+                    # Falls due while the command waits
+                    self.set_deadline(self.gatepasses[2], -1)
+                    time.sleep(seconds)
+                else:
+                    raise Stop
+
+        for gatepass in self.gatepasses[:2]:
+            self.set_deadline(gatepass, -1)
+        original, expire_gatepasses.time = expire_gatepasses.time, FakeTime
+        out = io.StringIO()
+        try:
+            with self.assertRaises(Stop):
+                call_command('expire_gatepasses', interval=1, stdout=out)
+        finally:
+            expire_gatepasses.time = original
+
+        self.assertIn('expired 2 gatepasses', out.getvalue())
+        self.assertIn('expired 1 gatepasses', out.getvalue())
+        self.assertEqual(sleeps[0], 1)
+        ids = [gatepass.pk for gatepass in self.gatepasses]
+        self.assertEqual(
+            set(Gatepass.objects.filter(pk__in=ids).values_list('status', 'version')), {('EXPIRED', 1)},
+        )
+        self.assertFalse(ParentInbox.objects.filter(gatepass_id__in=ids).exists())
+        self.assertEqual(GatepassEvent.objects.filter(gatepass_id__in=ids, action='Expired').count(), 3)
+
+
+class WardenGatepassListQueryCountTests(TestCase):
+    def setUp(self):
+        self.warden, _ = create_user('warden', 'WARDEN')
+        self.client.force_login(self.warden)
+        self.students = create_students(5)
+        # Warm up the session principal and expiry tracker so they don't add queries to the first request
+        tracker.reset()
+        self.client.get(reverse('warden-gatepass-list'))
+
+    def count_list_queries(self, **params):
+        params.setdefault('view', 'full')
+        params.setdefault('page_size', 500)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('warden-gatepass-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_is_constant(self):
+        create_gatepasses(self.students, 10)
+        small, response = self.count_list_queries()
+        self.assertEqual(len(response.json()['results']), 10)
+
+        create_gatepasses(self.students, 10_000 - 10)
+        large, response = self.count_list_queries()
+        self.assertEqual(len(response.json()['results']), 500)
+
+        self.assertEqual(small, large)
+
+    def test_nested_parents_are_serialized(self):
+        create_gatepasses(create_students(1, parents_per_student=3), 3)
+        _, response = self.count_list_queries()
+        for row in response.json()['results']:
+            self.assertEqual(len(row['student']['parents']), 3)
+            self.assertEqual(len(row['approval_tokens']), 3)
+            self.assertIn('name', row['approval_tokens'][0]['parent'])
+
+
+class WardenGatepassListPaginationTests(TestCase):
+    def setUp(self):
+        self.warden, _ = create_user('warden', 'WARDEN')
+        self.client.force_login(self.warden)
+        self.gatepasses = create_gatepasses(create_students(3), 25)
+
+    def test_cursor_walks_every_row_once(self):
+        seen = []
+        url = reverse('warden-gatepass-list') + '?page_size=10'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), {str(gatepass.id) for gatepass in self.gatepasses})
+
+    def test_compact_rows_omit_audit_and_nested_records(self):
+        row = self.client.get(reverse('warden-gatepass-list')).json()['results'][0]
+        self.assertNotIn('audit', row)
+        self.assertNotIn('approval_tokens', row)
+        self.assertIsInstance(row['student'], int)
+
+    def test_fields_parameter_selects_fields(self):
+        row = self.client.get(reverse('warden-gatepass-list'), {'fields': 'id,status'}).json()['results'][0]
+        self.assertEqual(set(row), {'id', 'status'})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('warden-gatepass-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PrincipalTests(TestCase):
+    def setUp(self):
+        self.student = create_students(1)[0]
+        self.client.force_login(self.student.profile.user)
+        tracker.reset()
+        tracker.expire_due()
+
+    def profile_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in queries if 'FROM "gatepass_profile"' in q['sql']]
+
+    def test_profile_is_loaded_once_per_session(self):
+        response, first = self.profile_queries(reverse('student-gatepass-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(first), 1)
+
+        response, second = self.profile_queries(reverse('student-gatepass-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(second, [])
+
+    def test_profile_change_invalidates_cached_principal(self):
+        self.client.get(reverse('student-gatepass-list'))
+        profile = self.student.profile
+        profile.user_type = 'WARDEN'
+        profile.save()
+
+        response = self.client.get(reverse('redirect-after-login'))
+        self.assertRedirects(response, reverse('warden-dashboard'), fetch_redirect_response=False)
+
+    def demote(self, user):
+        # A queryset update sends no signal, like a change made by another worker
+        # whose invalidation this process never saw
+        Profile.objects.filter(user=user).update(user_type='STUDENT')
+
+    def test_demoted_warden_loses_role_when_version_is_lost(self):
+        warden, _ = create_user('warden', 'WARDEN')
+        self.client.force_login(warden)
+        self.assertRedirects(self.client.get(reverse('redirect-after-login')), reverse('warden-dashboard'),
+                             fetch_redirect_response=False)
+        self.demote(warden)
+        # An evicted or never-shared version key must not match the session's copy
+        cache.clear()
+        response = self.client.get(reverse('redirect-after-login'))
+        self.assertRedirects(response, reverse('student-gatepass-list'), fetch_redirect_response=False)
+
+    def test_demoted_warden_loses_role_with_jwt(self):
+        warden, profile = create_user('warden', 'WARDEN')
+        access = self.client.post(reverse('token_obtain_pair'), {'username': 'warden', 'password': 'test1234'}).json()['access']
+        self.client.logout()
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+        url = reverse('gatepass-history', args=[create_gatepasses([self.student], 1)[0].pk])
+        self.assertEqual(self.client.get(url, **auth).status_code, 200)
+        profile.user_type = 'STUDENT'
+        profile.save()
+        self.assertEqual(self.client.get(url, **auth).status_code, 403)
+
+
+class ScanCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gatepass = create_gatepasses(create_students(1), 1)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(self.gatepass.pk, ['PENDING_PARENT'], 'APPROVED')
+        security, _ = create_user('guard', 'SECURITY')
+        self.client.force_login(security)
+        self.url = reverse('security-scan', args=[self.gatepass.pk])
+
+    def test_approval_warms_card(self):
+        with self.assertNumQueries(0):
+            card = scan.get_card(self.gatepass.pk)
+        self.assertEqual(card['status'], 'APPROVED')
+        self.assertEqual(card['state'], 'NOT_EXITED')
+
+    def test_override_and_movement_replace_card(self):
+        self.assertEqual(self.client.get(self.url).json()['status'], 'APPROVED')
+        with self.captureOnCommitCallbacks(execute=True):
+            movements.apply_movements([{'gatepass_id': str(self.gatepass.pk), 'action': 'exit'}])
+        self.assertEqual(self.client.get(self.url).json()['state'], 'OUT')
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(self.gatepass.pk, ['APPROVED'], 'REJECTED')
+        self.assertEqual(self.client.get(self.url).json()['status'], 'REJECTED')
+
+    def test_unknown_gatepass(self):
+        missing = reverse('security-scan', args=['00000000-0000-4000-8000-000000000000'])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+
+class MovementBatchTests(TestCase):
+    def setUp(self):
+        self.student = create_students(1)[0]
+        self.first, self.second = create_gatepasses([self.student], 2)
+        Gatepass.objects.update(status='APPROVED')
+        security, _ = create_user('guard', 'SECURITY')
+        self.client.force_login(security)
+
+    def post(self, *items):
+        response = self.client.post(
+            reverse('security-log-time-batch'),
+            {'items': [{'gatepass_id': str(gatepass_id), 'action': action} for gatepass_id, action in items]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return [result['ok'] for result in response.json()['results']]
+
+    def occupancy(self):
+        return list(StudentOccupancy.objects.values_list('student_id', 'gatepass_id'))
+
+    def test_exit_then_entry_in_one_batch(self):
+        self.assertEqual(self.post((self.first.pk, 'exit'), (self.first.pk, 'entry')), [True, True])
+        self.assertEqual(self.occupancy(), [])
+
+    def test_entry_of_one_pass_keeps_exit_of_another(self):
+        self.post((self.first.pk, 'exit'))
+        self.assertEqual(self.post((self.second.pk, 'exit'), (self.first.pk, 'entry')), [True, True])
+        self.assertEqual(self.occupancy(), [(self.student.pk, self.second.pk)])
+
+    def test_later_exit_replaces_earlier(self):
+        self.assertEqual(self.post((self.first.pk, 'exit')), [True])
+        self.assertEqual(self.post((self.second.pk, 'exit')), [True])
+        self.assertEqual(self.occupancy(), [(self.student.pk, self.second.pk)])
+        # The first pass is still out, so the student is too, as rebuild() agrees
+        self.assertEqual(self.post((self.second.pk, 'entry')), [True])
+        self.assertEqual(self.occupancy(), [(self.student.pk, self.first.pk)])
+        self.assertEqual(occupancy.rebuild(), 1)
+        self.assertEqual(self.post((self.first.pk, 'entry')), [True])
+        self.assertEqual(self.occupancy(), [])
+
+    def test_duplicates_and_unknown_ids(self):
+        unknown = '00000000-0000-4000-8000-000000000000'
+        results = self.post((self.first.pk, 'exit'), (self.first.pk, 'exit'), (unknown, 'exit'), ('garbage', 'exit'))
+        self.assertEqual(results, [True, False, False, False])
+        self.assertEqual(self.occupancy(), [(self.student.pk, self.first.pk)])
+        self.assertEqual(GatepassEvent.objects.filter(gatepass=self.first, action='Exit logged').count(), 1)
+
+    def test_entry_without_exit_fails(self):
+        self.assertEqual(self.post((self.first.pk, 'entry')), [False])
+
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        self.student = create_students(1)[0]
+        self.gatepass = create_gatepasses([self.student], 1)[0]
+        Gatepass.objects.update(status='APPROVED')
+        self.security, _ = create_user('guard', 'SECURITY')
+        self.warden, _ = create_user('warden', 'WARDEN')
+
+    def log(self, action):
+        self.client.force_login(self.security)
+        response = self.client.post(reverse('security-log-time', args=[self.gatepass.pk, action]))
+        self.assertEqual(response.status_code, 200)
+
+    def override(self, action):
+        self.client.force_login(self.warden)
+        response = self.client.post(reverse('warden-gatepass-action', args=[self.gatepass.pk, action]))
+        self.assertEqual(response.status_code, 200)
+
+    def assertMatchesRebuild(self, expected):
+        rows = list(StudentOccupancy.objects.values_list('student_id', 'gatepass_id'))
+        self.assertEqual(rows, expected)
+        self.assertEqual(occupancy.rebuild(), len(expected))
+        self.assertEqual(list(StudentOccupancy.objects.values_list('student_id', 'gatepass_id')), rows)
+
+    def test_exit_and_entry(self):
+        self.log('exit')
+        self.assertTrue(occupancy.is_out(self.student.pk))
+        self.assertMatchesRebuild([(self.student.pk, self.gatepass.pk)])
+        self.log('entry')
+        self.assertFalse(occupancy.is_out(self.student.pk))
+        self.assertMatchesRebuild([])
+
+    def test_override_of_an_exited_pass(self):
+        self.log('exit')
+        self.override('reject')
+        self.assertEqual(occupancy.headcount(), 0)
+        self.assertMatchesRebuild([])
+
+        self.override('approve')
+        self.assertEqual(occupancy.headcount(), 1)
+        self.assertMatchesRebuild([(self.student.pk, self.gatepass.pk)])
+
+    def test_movement_events_record_the_pass_status(self):
+        self.log('exit')
+        self.override('reject')
+        self.log('entry')
+        events = GatepassEvent.objects.filter(gatepass=self.gatepass, action__endswith='logged').order_by('created_at')
+        self.assertEqual(list(events.values_list('action', 'old_status', 'new_status')), [
+            ('Exit logged', 'APPROVED', 'APPROVED'),
+            ('Entry logged', 'REJECTED', 'REJECTED'),
+        ])
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        stats.invalidate()
+        self.gatepasses = create_gatepasses(create_students(3), 6)
+
+    def counted(self):
+        now = timezone.localtime()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        out = Gatepass.objects.filter(status='APPROVED', actual_exit_time__isnull=False, actual_entry_time__isnull=True)
+        counts = {
+            status.lower(): Gatepass.objects.filter(status=status).count()
+            for status in ['PENDING_PARENT', 'PENDING_WARDEN', 'APPROVED', 'REJECTED', 'EXPIRED']
+        }
+        return dict(
+            counts,
+            students_out=out.count(),
+            expected_returns=out.filter(to_time__gte=today, to_time__lt=today + timezone.timedelta(days=1)).count(),
+            pending_verifications=Gatepass.objects.filter(status='APPROVED', actual_exit_time__isnull=True).count(),
+        )
+
+    def test_counters_match_a_count_after_changes(self):
+        self.assertEqual(stats.get_counters(), self.counted())
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(self.gatepasses[0].pk, ['PENDING_PARENT'], 'PENDING_WARDEN')
+            transition(self.gatepasses[1].pk, ['PENDING_PARENT'], 'REJECTED')
+            transition(self.gatepasses[2].pk, None, 'APPROVED')
+            transition(self.gatepasses[3].pk, None, 'APPROVED')
+            movements.apply_movements([{'gatepass_id': str(self.gatepasses[2].pk), 'action': 'exit'}])
+        counters = stats.get_counters()
+        self.assertEqual(counters, self.counted())
+        self.assertEqual((counters['approved'], counters['students_out'], counters['pending_warden']), (2, 1, 1))
+
+    def test_cache_is_invalidated_on_commit(self):
+        before = stats.get_counters()
+        with self.captureOnCommitCallbacks() as callbacks:
+            transition(self.gatepasses[0].pk, ['PENDING_PARENT'], 'REJECTED')
+            # Uncommitted changes must not be dropped into the cache
+            self.assertEqual(cache.get(stats.CACHE_KEY), before)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(stats.CACHE_KEY))
+        self.assertEqual(stats.get_counters()['rejected'], before['rejected'] + 1)
+
+
+class RejectingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('rejected')
+
+
+class ApprovalEmailTests(TestCase):
+    def create_gatepass(self, parents):
+        student = create_students(1, parents_per_student=parents)[0]
+        now = timezone.now()
+        return Gatepass.objects.create(
+            student=student, purpose='Home visit', destination='Home',
+            from_time=now, to_time=now + timezone.timedelta(hours=4),
+        )
+
+    def test_query_count_does_not_grow_with_parents(self):
+        for parents in (1, 5):
+            gatepass = self.create_gatepass(parents)
+            queued = OutboundEmail.objects.count()
+            # Student and user, parents, token insert, outbox insert, savepoint and release
+            with self.assertNumQueries(6):
+                gatepass.send_approval_email()
+            self.assertEqual(ApprovalToken.objects.filter(gatepass=gatepass).count(), parents)
+            self.assertEqual(OutboundEmail.objects.count() - queued, parents)
+
+
+class ClaimCheckingEmailBackend(BaseEmailBackend):
+    """Records whether each outbox row was claimed at the moment it was sent."""
+    claimed = []
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            self.claimed.append(OutboundEmail.objects.filter(to=message.to[0], claim__isnull=False).exists())
+            mail.outbox.append(message)
+        return len(email_messages)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.emails = OutboundEmail.objects.bulk_create([
+            OutboundEmail(to=f'parent{i}@test.com', subject='Gatepass', body='Approve?') for i in range(3)
+        ])
+
+    def make_due(self):
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timezone.timedelta(seconds=1))
+
+    def test_a_claimed_email_is_not_claimed_again(self):
+        first = notifications.claim_batch(2)
+        second = notifications.claim_batch(10)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+        self.assertEqual(notifications.claim_batch(10), [])
+
+    def test_sent_emails_are_marked_sent(self):
+        self.assertEqual(notifications.dispatch_pending(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutboundEmail.objects.filter(status='SENT', attempts=1, claim=None).count(), 3)
+
+    @override_settings(EMAIL_BACKEND='gatepass.tests.RejectingEmailBackend')
+    def test_failures_back_off_exponentially(self):
+        base = timezone.timedelta(seconds=notifications.RETRY_BASE_SECONDS)
+        for attempt, backoff in [(1, base), (2, base * 2)]:
+            self.make_due()
+            before = timezone.now()
+            self.assertEqual(notifications.dispatch_pending(), (0, 3))
+            for email in OutboundEmail.objects.all():
+                self.assertEqual((email.status, email.attempts, email.claim), ('PENDING', attempt, None))
+                self.assertEqual(email.last_error, 'rejected')
+                self.assertGreaterEqual(email.next_attempt_at, before + backoff)
+                self.assertLess(email.next_attempt_at, timezone.now() + backoff)
+        # Not due until the backoff has passed
+        self.assertEqual(notifications.dispatch_pending(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='gatepass.tests.RejectingEmailBackend')
+    def test_gives_up_after_max_attempts(self):
+        for _ in range(notifications.MAX_ATTEMPTS):
+            self.make_due()
+            notifications.dispatch_pending()
+        self.assertEqual(
+            OutboundEmail.objects.filter(status='FAILED', attempts=notifications.MAX_ATTEMPTS).count(), 3,
+        )
+        self.make_due()
+        self.assertEqual(notifications.dispatch_pending(), (0, 0))
+
+    @override_settings(
+        GATEPASS_OUTBOX_DISPATCH_IN_PROCESS=False, EMAIL_BACKEND='gatepass.tests.ClaimCheckingEmailBackend',
+    )
+    def test_request_to_sent_email(self):
+        OutboundEmail.objects.all().delete()
+        student = create_students(1)[0]
+        self.client.force_login(student.profile.user)
+        start = timezone.localtime() + timezone.timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(reverse('student-request'), {
+                'purpose': 'Home visit',
+                'destination': 'Home',
+                'from_time': start.strftime('%Y-%m-%dT%H:%M'),
+                'to_time': (start + timezone.timedelta(hours=4)).strftime('%Y-%m-%dT%H:%M'),
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(notifications.kick, callbacks)
+
+        addresses = sorted(parent.email for parent in student.parents.all())
+        queued = OutboundEmail.objects.order_by('to')
+        self.assertEqual([email.to for email in queued], addresses)
+        self.assertEqual({(email.status, email.attempts) for email in queued}, {('PENDING', 0)})
+
+        ClaimCheckingEmailBackend.claimed = []
+        self.assertEqual(notifications.dispatch_pending(), (2, 0))
+        self.assertEqual(ClaimCheckingEmailBackend.claimed, [True, True])
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), addresses)
+        self.assertIn('/approve/', mail.outbox[0].body)
+        self.assertEqual(
+            set(OutboundEmail.objects.values_list('status', 'attempts', 'claim')), {('SENT', 1, None)},
+        )
+
+    def test_background_dispatch_failure_is_logged(self):
+        def fail():
+            raise RuntimeError('database is down')
+
+        original, notifications.dispatch_pending = notifications.dispatch_pending, fail
+        try:
+            with self.assertLogs('gatepass.notifications', 'ERROR') as logs:
+                notifications._dispatch_in_background()
+        finally:
+            notifications.dispatch_pending = original
+        self.assertIn('database is down', logs.output[0])
+
+
+class SignedPassTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gatepass = create_gatepasses(create_students(1), 1)[0]
+        self.transition(['PENDING_PARENT'], 'APPROVED')
+        self.gatepass = Gatepass.objects.select_related('student__profile__user').get(pk=self.gatepass.pk)
+        self.token = passes.issue(self.gatepass)
+
+    def transition(self, expected, new_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(self.gatepass.pk, expected, new_status)
+
+    def test_approved_pass_verifies_without_queries(self):
+        with self.assertNumQueries(0):
+            result = passes.verify(self.token)
+        self.assertTrue(result['valid'])
+        self.assertTrue(result['checked'])
+        self.assertEqual(result['pass']['id'], str(self.gatepass.pk))
+
+    def test_tampered_and_expired_passes_fail(self):
+        self.assertEqual(passes.verify(self.token[:-2] + 'xx')['reason'], 'bad_signature')
+        later = self.gatepass.to_time + timezone.timedelta(hours=1)
+        self.assertEqual(passes.verify(self.token, now=later)['reason'], 'expired')
+
+    def test_override_revokes_pass(self):
+        self.transition(['APPROVED'], 'REJECTED')
+        with self.assertNumQueries(0):
+            self.assertEqual(passes.verify(self.token)['reason'], 'revoked')
+
+    def test_reapproved_pass_needs_a_new_token(self):
+        self.transition(['APPROVED'], 'REJECTED')
+        self.transition(['REJECTED'], 'APPROVED')
+        self.assertEqual(passes.verify(self.token)['reason'], 'revoked')
+        self.gatepass.refresh_from_db()
+        self.assertTrue(passes.verify(passes.issue(self.gatepass))['valid'])
+
+    def test_stale_state_write_is_ignored(self):
+        self.transition(['APPROVED'], 'REJECTED')
+        passes.record_state(self.gatepass.pk, 'APPROVED', 1)
+        self.assertEqual(passes.verify(self.token)['reason'], 'revoked')
+
+    def test_unknown_state_is_flagged_unchecked(self):
+        cache.clear()
+        result = passes.verify(self.token)
+        self.assertEqual((result['valid'], result['checked']), (True, False))
+
+        class Unreachable:
+            def get(self, key):
+                raise ConnectionError('cache down')
+
+        original, passes.cache = passes.cache, Unreachable()
+        try:
+            with self.assertNumQueries(0), self.assertLogs('gatepass.passes', 'WARNING'):
+                result = passes.verify(self.token)
+        finally:
+            passes.cache = original
+        self.assertEqual((result['valid'], result['checked']), (True, False))
+
+    def test_verify_endpoint(self):
+        security, _ = create_user('guard', 'SECURITY')
+        self.client.force_login(security)
+        response = self.client.post(reverse('security-verify-pass'), {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['valid'])
+        self.assertTrue(response.json()['checked'])
+
+
+class ConcurrentTransitionTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.gatepass = create_gatepasses(create_students(1), 1)[0]
+
+    def run_concurrently(self, func):
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+
+        def worker(i):
+            barrier.wait()
+            try:
+                # The in-memory SQLite test database uses shared-cache table locks, which
+                # fail at once instead of waiting out the busy timeout; retry those so every
+                # thread reaches a real outcome. On-commit receivers that query (the recent
+                # requests invalidation) can hit the same lock and are logged, not retried.
+                for _ in range(100):
+                    try:
+                        outcomes.append(func(i))
+                    except TransitionConflict:
+                        outcomes.append('conflict')
+                    except OperationalError:
+                        time.sleep(0.01)
+                        continue
+                    break
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_only_one_parent_decision_wins(self):
+        outcomes = self.run_concurrently(lambda i: transition(
+            self.gatepass.pk, ['PENDING_PARENT'], 'PENDING_WARDEN' if i % 2 else 'REJECTED',
+            event=history.event('Parent acted', actor=f'parent{i}'),
+        ))
+        self.assertEqual(len(outcomes), self.THREADS)
+        self.assertEqual(outcomes.count('PENDING_PARENT'), 1)
+        self.assertEqual(outcomes.count('conflict'), self.THREADS - 1)
+
+        self.gatepass.refresh_from_db()
+        self.assertEqual(GatepassEvent.objects.filter(gatepass=self.gatepass, action='Parent acted').count(), 1)
+        self.assertEqual(self.gatepass.version, 1)
+
+    def test_concurrent_overrides_keep_every_audit_entry(self):
+        outcomes = self.run_concurrently(lambda i: transition(
+            self.gatepass.pk, None, 'APPROVED' if i % 2 else 'REJECTED',
+            event=history.event('Warden override', actor=f'warden{i}'),
+        ))
+        self.assertEqual(len(outcomes), self.THREADS)
+        succeeded = self.THREADS - outcomes.count('conflict')
+        self.assertGreaterEqual(succeeded, 1)
+
+        self.gatepass.refresh_from_db()
+        self.assertEqual(GatepassEvent.objects.filter(gatepass=self.gatepass, action='Warden override').count(), succeeded)
+        self.assertEqual(self.gatepass.version, succeeded)
+
+
+class GatepassHistoryTests(TestCase):
+    def setUp(self):
+        self.student = create_students(1)[0]
+        self.gatepass = create_gatepasses([self.student], 1)[0]
+
+    def test_transitions_are_streamed_in_order(self):
+        transition(self.gatepass.pk, ['PENDING_PARENT'], 'PENDING_WARDEN', event=history.event('Parent approved', actor='p'))
+        transition(self.gatepass.pk, ['PENDING_WARDEN'], 'APPROVED', event=history.event('Warden approved', actor='w'))
+
+        self.client.force_login(self.student.profile.user)
+        response = self.client.get(reverse('gatepass-history', args=[self.gatepass.pk]))
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['action'] for row in rows], ['Parent approved', 'Warden approved'])
+        self.assertEqual(rows[1]['old_status'], 'PENDING_WARDEN')
+        self.assertEqual(rows[1]['new_status'], 'APPROVED')
+
+    def test_other_students_cannot_read_history(self):
+        other = create_students(1)[0]
+        self.client.force_login(other.profile.user)
+        response = self.client.get(reverse('gatepass-history', args=[self.gatepass.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_migrated_audit_entries_get_their_statuses(self):
+        migration = importlib.import_module('gatepass.migrations.0015_gatepassevent')
+        audit = [
+            {'action': 'Parent approved', 'parent': 'p'},
+            {'action': 'Warden approved', 'old_status': 'PENDING_WARDEN', 'user': 'w'},
+            {'action': 'Exit noted', 'old_status': 'APPROVED'},
+            {'action': 'Warden rejected (override)', 'old_status': 'APPROVED', 'user': 'w'},
+            {'action': 'Note'},
+        ]
+        self.assertEqual(migration.audit_statuses(audit, 'REJECTED'), [
+            ('', 'PENDING_WARDEN'),
+            ('PENDING_WARDEN', 'APPROVED'),
+            ('APPROVED', 'APPROVED'),
+            ('APPROVED', 'REJECTED'),
+            ('REJECTED', 'REJECTED'),
+        ])
+
+    def test_failing_receiver_is_logged(self):
+        def broken(sender, **kwargs):
+            raise RuntimeError('boom')
+
+        signals.gatepass_changed.connect(broken)
+        try:
+            with self.assertLogs('gatepass.signals', 'ERROR') as logs:
+                signals._send_changed([self.gatepass.pk], 'APPROVED')
+        finally:
+            signals.gatepass_changed.disconnect(broken)
+        self.assertIn('broken', logs.output[0])
+        self.assertIn('RuntimeError: boom', logs.output[0])
+
+
+class WardenExportTests(TestCase):
+    def setUp(self):
+        self.warden, _ = create_user('warden', 'WARDEN')
+        self.client.force_login(self.warden)
+        self.students = create_students(2)
+        self.gatepasses = create_gatepasses(self.students, 6)
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse('warden-gatepass-export', args=[fmt]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_every_row(self):
+        lines = self.export('csv').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'roll_no', 'student'])
+        self.assertEqual(len(lines), 7)
+
+    def test_ndjson_export_filters_by_student_and_status(self):
+        Gatepass.objects.filter(pk=self.gatepasses[0].pk).update(status='APPROVED')
+        rows = [json.loads(line) for line in self.export(
+            'ndjson', student=self.students[0].roll_no, status='pending_parent'
+        ).splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row['roll_no'] == self.students[0].roll_no for row in rows))
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('warden-gatepass-export', args=['csv']), {'from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LifecycleBenchmarkTests(TestCase):
+    def test_every_lifecycle_step_succeeds(self):
+        _, rows = benchmark.run(students=2, gatepasses_per_student=2, workers=1)
+        self.assertEqual([row['endpoint'] for row in rows], [
+            'student-request', 'parent-approve', 'warden-gatepass-list', 'warden-approve',
+            'student-gatepass-list', 'security-scan', 'security-exit', 'security-entry',
+        ])
+        for row in rows:
+            self.assertEqual(row['requests'], 4)
+            self.assertEqual(row['errors'], 0, row['endpoint'])
+        self.assertFalse(Student.objects.filter(roll_no__startswith=benchmark.PREFIX).exists())
+
+    def test_refuses_to_tear_down_a_database_with_other_accounts(self):
+        create_user('real', 'WARDEN')
+        seeding.create_students(benchmark.PREFIX, 0, 1, parents_per_student=1)
+        with self.assertRaises(seeding.SeedingError):
+            benchmark.run(students=1, gatepasses_per_student=1, workers=1)
+        self.assertTrue(Student.objects.filter(roll_no__startswith=benchmark.PREFIX).exists())
+
+        seeding.remove(benchmark.PREFIX, force=True)
+        self.assertFalse(Student.objects.filter(roll_no__startswith=benchmark.PREFIX).exists())
+        self.assertFalse(Parent.objects.filter(name__startswith=benchmark.PREFIX).exists())
+        self.assertTrue(User.objects.filter(username='real').exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        stats.invalidate()
+        self.warden, _ = create_user('warden', 'WARDEN')
+        self.warden.is_staff = True
+        self.warden.save(update_fields=['is_staff'])
+        self.client.force_login(self.warden)
+
+    def test_requests_are_recorded_per_view(self):
+        create_gatepasses(create_students(2), 3)
+        self.client.get(reverse('warden-gatepass-list'))
+        self.client.get(reverse('warden-dashboard'))
+        self.client.get(reverse('warden-dashboard'))
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('gatepass_request_duration_seconds_count{view="warden-gatepass-list",method="GET"} 1', body)
+        self.assertIn('gatepass_responses_total{view="warden-dashboard",method="GET",status="200"} 2', body)
+        self.assertIn('gatepass_cache_requests_total{cache="stats",result="miss"} 1', body)
+        self.assertIn('gatepass_cache_requests_total{cache="stats",result="hit"} 1', body)
+        self.assertRegex(body, r'gatepass_request_queries_sum\{view="warden-gatepass-list",method="GET"\} [1-9]')
+
+    def test_metrics_require_staff_outside_allowed_addresses(self):
+        self.client.logout()
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 403)
+
+        with override_settings(GATEPASS_METRICS_ALLOWED_IPS=['10.0.0.5']):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+
+    def test_loopback_is_not_trusted_by_default(self):
+        # Behind a reverse proxy on the same host every request arrives from loopback
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+        non_staff, _ = create_user('student', 'STUDENT')
+        self.client.force_login(non_staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(GATEPASS_METRICS_TOKEN='scrape-secret')
+    def test_bearer_token_allows_scraping(self):
+        self.client.logout()
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        self.security, _ = create_user('security', 'SECURITY')
+        self.gatepass = create_gatepasses(create_students(1), 1)[0]
+        Gatepass.objects.filter(pk=self.gatepass.pk).update(status='APPROVED')
+
+    def test_snapshot_returns_events_after_last_id(self):
+        self.client.force_login(self.security)
+        last_id = live.latest_id()
+        movements.apply_movements([{'gatepass_id': self.gatepass.pk, 'action': 'exit'}], actor='gate1')
+
+        response = self.client.get(reverse('live-events'), {'last_id': last_id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        # The test client is WSGI, so the browser is told to poll slowly
+        self.assertTrue(body.startswith(f'retry: {live.POLL_RETRY_MS}\n'))
+        self.assertGreater(live.POLL_RETRY_MS, live.RETRY_MS)
+        self.assertIn('event: gatepass', body)
+        self.assertIn('"action": "Exit logged"', body)
+        self.assertIn('event: stats', body)
+
+        response = self.client.get(reverse('live-events'), HTTP_LAST_EVENT_ID=str(live.latest_id()))
+        self.assertNotIn('event: gatepass', response.content.decode())
+
+    def test_students_cannot_subscribe(self):
+        self.client.force_login(self.gatepass.student.profile.user)
+        self.assertEqual(self.client.get(reverse('live-events')).status_code, 403)
+
+    def test_stream_wakes_on_change(self):
+        async def first_event():
+            stream = live.stream(live_id, max_seconds=5)
+            self.assertTrue((await stream.__anext__()).startswith('retry:'))
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.05)
+            await sync_to_async(movements.apply_movements)([{'gatepass_id': self.gatepass.pk, 'action': 'exit'}])
+            # TestCase never commits, so deliver the on-commit signal by hand
+            live.notifier.notify()
+            chunk = await asyncio.wait_for(pending, 2)
+            await stream.aclose()
+            return chunk
+
+        live_id = live.latest_id()
+        self.assertIn('Exit logged', async_to_sync(first_event)())
+
+
+class StudentHistoryTests(TestCase):
+    def setUp(self):
+        self.student = create_students(1)[0]
+        self.client.force_login(self.student.profile.user)
+        tracker.reset()
+        tracker.expire_due()
+        cache.clear()
+
+    def test_history_is_paginated_with_cursor(self):
+        gatepasses = create_gatepasses([self.student], 45)
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('student-gatepass-list'), {'cursor': cursor} if cursor else {})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(gatepass.pk for gatepass in response.context['gatepasses'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(set(seen), {gatepass.pk for gatepass in gatepasses})
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('student-gatepass-list'), {'cursor': 'garbage'}).status_code, 404)
+
+    def recent_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-request'))
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if 'FROM "gatepass_gatepass"' in q['sql']], response
+
+    @override_settings(GATEPASS_OUTBOX_DISPATCH_IN_PROCESS=False)
+    def test_recent_requests_fragment_is_cached_until_a_new_request(self):
+        create_gatepasses([self.student], 2)
+        first, _ = self.recent_queries()
+        self.assertEqual(len(first), 1)
+        second, _ = self.recent_queries()
+        self.assertEqual(second, [])
+
+        start = timezone.localtime() + timezone.timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('student-request'), {
+                'purpose': 'Library', 'destination': 'Town',
+                'from_time': start.strftime('%Y-%m-%dT%H:%M'),
+                'to_time': (start + timezone.timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M'),
+            })
+        self.assertEqual(response.status_code, 302)
+
+        third, response = self.recent_queries()
+        self.assertEqual(len(third), 1)
+        self.assertContains(response, 'Library')
+
+
+class ApprovalLinkTests(TestCase):
+    def setUp(self):
+        self.gatepass = create_gatepasses(create_students(1), 1)[0]
+        self.first, self.second = ApprovalToken.objects.filter(gatepass=self.gatepass)
+        tracker.reset()
+        tracker.expire_due()
+
+    def test_approval_runs_a_fixed_number_of_queries(self):
+        # Token read, token use, gatepass update, inbox lookup, sibling tokens, history
+        # insert, plus two savepoint pairs under the test case's transaction
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('approval-action', args=[self.first.token, 'approve']))
+        self.assertEqual(response.status_code, 200)
+        self.gatepass.refresh_from_db()
+        self.assertEqual(self.gatepass.status, 'PENDING_WARDEN')
+
+    def test_sibling_links_stop_working(self):
+        self.client.get(reverse('approval-action', args=[self.first.token, 'approve']))
+        self.second.refresh_from_db()
+        self.assertTrue(self.second.used)
+        self.assertIsNone(self.second.action_taken)
+        response = self.client.get(reverse('approval-action', args=[self.second.token, 'reject']))
+        self.assertEqual(response.status_code, 400)
+        self.gatepass.refresh_from_db()
+        self.assertEqual(self.gatepass.status, 'PENDING_WARDEN')
+
+
+class TokenArchiveTests(TestCase):
+    def setUp(self):
+        self.student = create_students(1)[0]
+        self.gatepasses = create_gatepasses([self.student], 3)
+        now = timezone.now()
+        old = now - timezone.timedelta(days=tokens.RETENTION_DAYS + 1)
+        used, expired, valid = self.gatepasses
+        # created_at is auto_now_add, so age the rows after insert
+        ApprovalToken.objects.update(created_at=old)
+        ApprovalToken.objects.filter(gatepass=used).update(used=True, used_at=old, expires_at=old)
+        ApprovalToken.objects.filter(gatepass=expired).update(expires_at=old)
+        ApprovalToken.objects.filter(gatepass=valid).update(expires_at=now + timezone.timedelta(hours=1))
+
+    def test_old_used_and_expired_tokens_are_archived(self):
+        used, expired, valid = self.gatepasses
+        self.assertEqual(tokens.archive_stale(batch_size=3), 4)
+        self.assertEqual(list(ApprovalToken.objects.values_list('gatepass_id', flat=True).distinct()), [valid.pk])
+        archived = ApprovalTokenArchive.objects.filter(gatepass_id=used.pk)
+        self.assertEqual(archived.count(), 2)
+        self.assertTrue(all(token.used for token in archived))
+        self.assertEqual(archived[0].student_roll_no, self.student.roll_no)
+
+    def test_recent_tokens_are_kept(self):
+        ApprovalToken.objects.update(created_at=timezone.now())
+        self.assertEqual(tokens.archive_stale(), 0)
+        self.assertEqual(ApprovalToken.objects.count(), 6)
+
+
+@override_settings(GATEPASS_OUTBOX_DISPATCH_IN_PROCESS=False)
+class ParentInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tracker.reset()
+        self.student = create_students(1)[0]
+        self.parent = self.student.parents.first()
+        user, self.parent.profile = create_user('parent', 'PARENT')
+        self.parent.save()
+        self.client.force_login(user)
+
+    def request(self, expires_in=timezone.timedelta(hours=1)):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            return Gatepass.objects.create(
+                student=self.student, purpose='Home visit', destination='Home',
+                from_time=now, to_time=now + timezone.timedelta(hours=4),
+                request_expires_at=now + expires_in,
+            )
+
+    def test_request_lands_in_every_parent_inbox(self):
+        gatepass = self.request()
+        self.assertEqual(ParentInbox.objects.filter(gatepass=gatepass).count(), 2)
+        self.assertEqual(inbox.pending_count(self.parent.pk), 1)
+
+    def test_parent_decision_clears_inbox(self):
+        gatepass = self.request()
+        self.assertEqual(inbox.pending_count(self.parent.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('parent-approve', args=[gatepass.pk]), {'action': 'approve'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['new_status'], 'PENDING_WARDEN')
+        self.assertFalse(ParentInbox.objects.filter(gatepass=gatepass).exists())
+        self.assertEqual(inbox.pending_count(self.parent.pk), 0)
+
+    def test_expired_requests_leave_inbox(self):
+        gatepass = self.request(expires_in=-timezone.timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            tracker.expire_due(force=True)
+        self.assertFalse(ParentInbox.objects.filter(gatepass=gatepass).exists())
+        self.assertEqual(inbox.pending_count(self.parent.pk), 0)
+
+    def test_dashboard_is_served_from_inbox(self):
+        first, second = self.request(), self.request(expires_in=timezone.timedelta(minutes=30))
+        response = self.client.get(reverse('parent-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry.gatepass_id for entry in response.context['pending_requests']], [second.pk, first.pk])
+        self.assertEqual(response.context['parent_pending_count'](), 2)
+        self.assertContains(response, f'id="request-{first.pk}"')
+
+    def test_other_parents_cannot_decide(self):
+        gatepass = self.request()
+        other = create_students(1)[0].parents.first()
+        user, other.profile = create_user('other-parent', 'PARENT')
+        other.save()
+        self.client.force_login(user)
+        response = self.client.post(reverse('parent-approve', args=[gatepass.pk]), {'action': 'approve'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_parent_linked_later_gets_pending_requests(self):
+        gatepass = self.request()
+        late = Parent.objects.create(name='Guardian')
+        self.student.parents.add(late)
+        self.assertTrue(ParentInbox.objects.filter(parent=late, gatepass=gatepass).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            late.children.remove(self.student)
+        self.assertFalse(ParentInbox.objects.filter(parent=late).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.parents.clear()
+        self.assertFalse(ParentInbox.objects.exists())
+        self.assertEqual(inbox.pending_count(self.parent.pk), 0)
+
+    def test_rebuild(self):
+        gatepass = self.request()
+        ParentInbox.objects.all().delete()
+        self.assertEqual(inbox.rebuild(), 2)
+        self.assertEqual(ParentInbox.objects.filter(gatepass=gatepass).count(), 2)
+
+
+@override_settings(GATEPASS_OUTBOX_DISPATCH_IN_PROCESS=False)
+class GatepassArchiveTests(TestCase):
+    def setUp(self):
+        tracker.reset()
+        tracker.expire_due()
+        self.student = create_students(1)[0]
+        self.gatepasses = create_gatepasses([self.student], 30)
+        old = timezone.now() - timezone.timedelta(days=archive.RETENTION_DAYS + 1)
+        # Twenty old closed passes, one old pass still waiting on the warden, nine recent ones
+        for i, gatepass in enumerate(self.gatepasses[:21]):
+            Gatepass.objects.filter(pk=gatepass.pk).update(
+                created_at=old - timezone.timedelta(minutes=i),
+                to_time=old,
+                status='PENDING_WARDEN' if i == 20 else 'REJECTED' if i % 2 else 'APPROVED',
+                actual_exit_time=old if i % 4 == 0 else None,
+                actual_entry_time=old if i % 4 == 0 else None,
+            )
+        history.record(self.gatepasses[1].pk, history.event('Warden rejected', 'PENDING_WARDEN', 'REJECTED', 'w'))
+
+    def test_closed_gatepasses_move_to_archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.archive_closed(batch_size=7), 20)
+        archived_ids = {gatepass.pk for gatepass in self.gatepasses[:20]}
+        self.assertEqual(set(GatepassArchive.objects.values_list('pk', flat=True)), archived_ids)
+        self.assertFalse(Gatepass.objects.filter(pk__in=archived_ids).exists())
+        self.assertEqual(Gatepass.objects.count(), 10)
+        self.assertFalse(ApprovalToken.objects.filter(gatepass_id__in=archived_ids).exists())
+        self.assertEqual(ApprovalTokenArchive.objects.filter(gatepass_id__in=archived_ids).count(), 40)
+        self.assertEqual(archive.archive_closed(), 0)
+
+    def test_reads_span_live_and_archived(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            archive.archive_closed()
+        self.client.force_login(self.student.profile.user)
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('student-gatepass-list'), {'cursor': cursor} if cursor else {})
+            seen.extend(response.context['gatepasses'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 30)
+        self.assertEqual({gatepass.pk for gatepass in seen}, {gatepass.pk for gatepass in self.gatepasses})
+        self.assertEqual(seen, sorted(seen, key=lambda gatepass: (gatepass.created_at, gatepass.pk), reverse=True))
+
+        response = self.client.get(reverse('gatepass-history', args=[self.gatepasses[1].pk]))
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['action'] for row in rows], ['Warden rejected'])
+
+    def test_exports_and_warden_list_span_the_cutoff(self):
+        warden, _ = create_user('warden', 'WARDEN')
+        self.client.force_login(warden)
+        start = (timezone.now() - timezone.timedelta(days=archive.RETENTION_DAYS + 2)).date().isoformat()
+
+        def export():
+            response = self.client.get(reverse('warden-gatepass-export', args=['ndjson']), {'from': start})
+            return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        def listed(view):
+            seen, url = [], reverse('warden-gatepass-list') + f'?page_size=7&view={view}'
+            while url:
+                data = self.client.get(url).json()
+                seen.extend(data['results'])
+                url = data['next']
+            return seen
+
+        before_export, before_compact, before_full = export(), listed('compact'), listed('full')
+        self.assertEqual(len(before_export), 30)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.archive_closed(), 20)
+
+        # Same rows in the same (created_at, id) order, now merged from both tables
+        self.assertEqual(export(), before_export)
+        self.assertEqual(listed('compact'), before_compact)
+        after_full = listed('full')
+        self.assertEqual([row['id'] for row in after_full], [row['id'] for row in before_full])
+        archived = next(row for row in after_full if row['id'] == str(self.gatepasses[0].pk))
+        self.assertEqual(len(archived['approval_tokens']), 2)
+        self.assertIn('name', archived['approval_tokens'][0]['parent'])
+        self.assertEqual(len(archived['student']['parents']), 2)
+
+
+class SettingsTests(TestCase):
+    def env(self, **values):
+        return mock.patch.dict(os.environ, values, clear=True)
+
+    def test_sqlite_leaves_the_journal_mode_to_the_file(self):
+        with self.env():
+            database = project_settings._database()
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['OPTIONS'], {'timeout': 20, 'transaction_mode': 'IMMEDIATE'})
+
+        with self.env(GATEPASS_DB_SQLITE_WAL='1', GATEPASS_DB_SQLITE_TIMEOUT='5'):
+            options = project_settings._database()['OPTIONS']
+        self.assertEqual(options['timeout'], 5)
+        self.assertEqual(options['init_command'], 'PRAGMA synchronous=NORMAL;')
+        self.assertNotIn('journal_mode', options['init_command'])
+
+    def test_postgres_pool_disables_persistent_connections(self):
+        with self.env(GATEPASS_DB_ENGINE='postgres', GATEPASS_DB_CONN_MAX_AGE='30'):
+            database = project_settings._database()
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+        self.assertEqual(database['OPTIONS'], {})
+
+        with self.env(GATEPASS_DB_ENGINE='PostgreSQL', GATEPASS_DB_POOL='true', GATEPASS_DB_POOL_MAX_SIZE='4'):
+            database = project_settings._database()
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool'], {'min_size': 2, 'max_size': 4, 'timeout': 10})
+
+        with self.env(GATEPASS_DB_ENGINE='mysql'), self.assertRaises(ValueError):
+            project_settings._database()
+
+    def test_cache_backend_selection(self):
+        with self.env():
+            self.assertEqual(project_settings._cache()['BACKEND'], 'django.core.cache.backends.filebased.FileBasedCache')
+        with self.env(GATEPASS_TESTING='1'):
+            self.assertEqual(project_settings._cache()['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        with self.env(GATEPASS_CACHE_URL='redis://cache:6379/1', GATEPASS_CACHE_BACKEND='file'):
+            self.assertEqual(project_settings._cache(), {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://cache:6379/1',
+            })
+        with self.env(GATEPASS_CACHE_BACKEND='DB', GATEPASS_CACHE_MAX_ENTRIES='500'):
+            cache_settings = project_settings._cache()
+        self.assertEqual(cache_settings['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+        self.assertEqual(cache_settings['OPTIONS'], {'MAX_ENTRIES': 500})
+
+        with self.env(GATEPASS_CACHE_BACKEND='memcached'), self.assertRaises(ValueError):
+            project_settings._cache()
+
+    def test_test_runner_uses_a_per_process_cache(self):
+        self.assertEqual(settings.CACHES['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertIsInstance(caches['default'], LocMemCache)
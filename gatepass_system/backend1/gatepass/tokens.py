@@ -0,0 +1,62 @@
+"""
+Keeps the ApprovalToken table down to recent tokens. Tokens older than the
+retention window that were used or have expired are copied to
+ApprovalTokenArchive and deleted, a bounded batch per transaction so the
+sweep never holds the write lock for long.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ApprovalToken, ApprovalTokenArchive
+
+RETENTION_DAYS = getattr(settings, 'GATEPASS_TOKEN_RETENTION_DAYS', 7)
+BATCH_SIZE = 500
+
+ARCHIVED_FIELDS = (
+    'token', 'gatepass_id', 'gatepass__student__roll_no', 'parent_id', 'parent__name',
+    'created_at', 'expires_at', 'used_at', 'used', 'action_taken',
+)
+
+
+def stale(now=None, retention_days=None):
+    now = now or timezone.now()
+    cutoff = now - timezone.timedelta(days=RETENTION_DAYS if retention_days is None else retention_days)
+    # A link still inside its own validity is never archived, whatever its age
+    return ApprovalToken.objects.filter(Q(used=True) | Q(expires_at__lte=now), created_at__lt=cutoff)
+
+
+def archive(queryset):
+    """Copy the tokens in `queryset` to the archive and delete them. Returns the number moved."""
+    with transaction.atomic():
+        rows = list(queryset.values_list(*ARCHIVED_FIELDS))
+        if not rows:
+            return 0
+        ApprovalTokenArchive.objects.bulk_create([
+            ApprovalTokenArchive(
+                token=token, gatepass_id=gatepass_id, student_roll_no=roll_no, parent_id=parent_id,
+                parent_name=parent_name, created_at=created_at, expires_at=expires_at,
+                used_at=used_at, used=used, action_taken=action_taken,
+            )
+            for token, gatepass_id, roll_no, parent_id, parent_name, created_at, expires_at, used_at, used, action_taken
+            in rows
+        ], ignore_conflicts=True)
+        ApprovalToken.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_batch(now=None, retention_days=None, batch_size=BATCH_SIZE):
+    """Archive up to `batch_size` stale tokens, oldest first. Returns the number moved."""
+    return archive(stale(now, retention_days).order_by('created_at')[:batch_size])
+
+
+def archive_stale(now=None, retention_days=None, batch_size=BATCH_SIZE):
+    """Archive every stale token in batches. Returns the total moved."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        moved = archive_batch(now, retention_days, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
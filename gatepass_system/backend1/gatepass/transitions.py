@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import history, inbox, occupancy, passes
+from .models import ApprovalToken, Gatepass
+from .signals import notify_changed
+
+# How many times a transition re-reads the row after losing a race on `version`
+MAX_RETRIES = 3
+
+
+class TransitionConflict(Exception):
+    """
+    Raised when a gatepass is not in one of the expected states, typically
+    because a concurrent action already moved it on.
+    """
+    def __init__(self, gatepass_id, expected, actual):
+        self.gatepass_id = gatepass_id
+        self.expected = tuple(expected)
+        self.actual = actual
+        super().__init__(
+            f"Gatepass {gatepass_id} is {actual or 'missing'}, expected one of {', '.join(self.expected)}."
+        )
+
+
+def transition(gatepass_id, expected, new_status, event=None, current=None, **fields):
+    """
+    Move a gatepass from one of the `expected` statuses (None for any) to
+    `new_status` with a single compare-and-set UPDATE on (status, version).
+    `fields` are written in the same statement. `event`, a history.event()
+    dict or a callable taking the previous status, is appended to the
+    gatepass history in the same transaction. `current`, a (status, version)
+    pair the caller has already read, saves the initial read; if it is stale
+    the row is re-read as after any lost race. Returns the previous status,
+    or raises TransitionConflict.
+    """
+    expected = tuple(expected or (code for code, _ in Gatepass.STATUS_CHOICES))
+    if current is not None:
+        current = {'status': current[0], 'version': current[1]}
+    for _ in range(MAX_RETRIES):
+        if current is None:
+            current = Gatepass.objects.filter(pk=gatepass_id).values('status', 'version').first()
+        if current is None or current['status'] not in expected:
+            raise TransitionConflict(gatepass_id, expected, current and current['status'])
+
+        with transaction.atomic():
+            updated = Gatepass.objects.filter(
+                pk=gatepass_id, status=current['status'], version=current['version']
+            ).update(status=new_status, version=F('version') + 1, **fields)
+            if updated:
+                if current['status'] == 'PENDING_PARENT' and new_status != 'PENDING_PARENT':
+                    inbox.remove([gatepass_id])
+                    # The other parents' email links must not act on a decided request
+                    ApprovalToken.objects.filter(gatepass_id=gatepass_id, used=False).update(
+                        used=True, used_at=timezone.now()
+                    )
+                if current['status'] == 'APPROVED' or (new_status == 'APPROVED' and current['status'] != 'PENDING_WARDEN'):
+                    # Only overrides get here, and they can revoke or restore a pass that is already out
+                    occupancy.refresh(gatepass_id)
+                if 'APPROVED' in (current['status'], new_status):
+                    version = current['version'] + 1
+                    transaction.on_commit(lambda: passes.record_state(gatepass_id, new_status, version), robust=True)
+                if event is not None:
+                    entry = event(current['status']) if callable(event) else event
+                    history.record(gatepass_id, dict(entry, old_status=current['status'], new_status=new_status))
+                notify_changed([gatepass_id], new_status)
+                return current['status']
+        current = None
+
+    current = Gatepass.objects.filter(pk=gatepass_id).values_list('status', flat=True).first()
+    raise TransitionConflict(gatepass_id, expected, current)
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import (GatepassListCreateAPIView, ApprovalActionAPIView,
-                    WardenGatepassListAPIView, WardenGatepassActionAPIView, SecurityGatepassDetailAPIView,
-                    SecurityLogTimeAPIView, WardenDashboardView, StudentRequestView, StudentGatepassListView,
+from .parent_views import ParentDashboardView, ParentApprovalView
+from .views import (GatepassListCreateAPIView, GatepassHistoryAPIView, ApprovalActionAPIView,
+                    WardenGatepassListAPIView, WardenGatepassExportAPIView, WardenGatepassActionAPIView, SecurityGatepassDetailAPIView,
+                    SecurityLogTimeAPIView, SecurityLogTimeBatchAPIView, SecurityScanAPIView, SecurityVerifyPassAPIView,
+                    WardenDashboardView, LiveEventsView, StudentRequestView, StudentGatepassListView,
                     SecurityDashboardView, UserLoginView, redirect_after_login, IndexView, CustomLogoutView)
 
 
@@ -11,18 +13,27 @@ urlpatterns = [
     path('login/student/', UserLoginView.as_view(initial={'user_type': 'STUDENT'}), name='student-login'),
     path('login/warden/', UserLoginView.as_view(initial={'user_type': 'WARDEN'}), name='warden-login'),
     path('login/security/', UserLoginView.as_view(initial={'user_type': 'SECURITY'}), name='security-login'),
+    path('login/parent/', UserLoginView.as_view(initial={'user_type': 'PARENT'}), name='parent-login'),
     path('logout/', CustomLogoutView.as_view(), name='logout'),
     path('redirect/', redirect_after_login, name='redirect-after-login'),
     path('gatepasses/', GatepassListCreateAPIView.as_view()),
+    path('gatepasses/<uuid:pk>/events/', GatepassHistoryAPIView.as_view(), name='gatepass-history'),
     path('approval/<uuid:token>/<str:action>/', ApprovalActionAPIView.as_view(), name='approval-action'),
 
     path('warden/gatepasses/', WardenGatepassListAPIView.as_view(), name='warden-gatepass-list'),
+    path('warden/gatepasses/export/<str:fmt>/', WardenGatepassExportAPIView.as_view(), name='warden-gatepass-export'),
     path('warden/gatepasses/<uuid:pk>/<str:action>/', WardenGatepassActionAPIView.as_view(), name='warden-gatepass-action'),
     path('warden/dashboard/', WardenDashboardView.as_view(), name='warden-dashboard'),
+    path('live/events/', LiveEventsView.as_view(), name='live-events'),
     path('student/request/', StudentRequestView.as_view(), name='student-request'),
     path('student/gatepasses/', StudentGatepassListView.as_view(), name='student-gatepass-list'),
+    path('parent/dashboard/', ParentDashboardView.as_view(), name='parent-dashboard'),
+    path('parent/approve/<uuid:gatepass_id>/', ParentApprovalView.as_view(), name='parent-approve'),
     path('security/dashboard/', SecurityDashboardView.as_view(), name='security-dashboard'),
     path('security/verify/<uuid:id>/', SecurityGatepassDetailAPIView.as_view(), name='security-verify'),
+    path('security/scan/<uuid:id>/', SecurityScanAPIView.as_view(), name='security-scan'),
+    path('security/verify-pass/', SecurityVerifyPassAPIView.as_view(), name='security-verify-pass'),
+    path('security/log/batch/', SecurityLogTimeBatchAPIView.as_view(), name='security-log-time-batch'),
     path('security/log/<uuid:pk>/<str:action>/', SecurityLogTimeAPIView.as_view(), name='security-log-time'),
 
 ]
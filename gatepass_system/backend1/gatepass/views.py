@@ -1,16 +1,23 @@
 from rest_framework.permissions import IsAuthenticated, BasePermission
-from rest_framework import generics, status
+from rest_framework import generics, serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authentication import SessionAuthentication
 from django.shortcuts import get_object_or_404, render, redirect
 from django.views.generic import View, TemplateView
 from .models import Student, Parent, Gatepass, ApprovalToken
-from .serializers import StudentSerializer, ParentSerializer, GatepassSerializer
+from .serializers import (StudentSerializer, ParentSerializer, GatepassSerializer, GatepassArchiveSerializer,
+                          GatepassListSerializer)
+from .pagination import InvalidCursor, KeysetPagination
+from .principal import get_principal, load_principal, store_principal
+from .stats import get_counters
+from . import archive, exports, history, live, movements, occupancy, passes, recent, scan, transitions
 from .forms import GatepassRequestForm
-from django.core.mail import send_mail
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from django.urls import reverse
-from django.utils import timezone
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.contrib.auth.views import LogoutView
@@ -42,46 +49,46 @@ class UserLoginView(LoginView):
         # Check POST data first, then query parameter as fallback
         selected_role = self.request.POST.get('user_type') or self.request.GET.get('role')
 
-        try:
-            user_type = user.profile.user_type
-            if user_type != selected_role.upper():
-                form.add_error(None, "Invalid role selected for this account.")
-                return self.form_invalid(form)
+        principal = load_principal(user)
+        user_type = principal.role
+        if user_type is None:
+            form.add_error(None, "User profile not found.")
+            return self.form_invalid(form)
 
-            # Login the user
-            response = super().form_valid(form)
+        if user_type != (selected_role or '').upper():
+            form.add_error(None, "Invalid role selected for this account.")
+            return self.form_invalid(form)
 
-            # Store role in session
-            self.request.session['user_role'] = user_type
+        # Login the user
+        response = super().form_valid(form)
 
-            # Redirect based on role
-            redirect_urls = {
-                'STUDENT': 'student-gatepass-list',
-                'WARDEN': 'warden-dashboard',
-                'SECURITY': 'security-dashboard'
-            }
+        # Store role and resolved principal in session
+        self.request.session['user_role'] = user_type
+        store_principal(self.request, principal)
 
-            return redirect(redirect_urls.get(user_type, 'login'))
+        # Redirect based on role
+        redirect_urls = {
+            'STUDENT': 'student-gatepass-list',
+            'WARDEN': 'warden-dashboard',
+            'SECURITY': 'security-dashboard',
+            'PARENT': 'parent-dashboard',
+        }
 
-        except AttributeError:
-            form.add_error(None, "User profile not found.")
-            return self.form_invalid(form)
+        return redirect(redirect_urls.get(user_type, 'login'))
 
 from django.shortcuts import redirect
 
 def redirect_after_login(request):
-    if request.user.is_authenticated:
-        try:
-            user_type = request.user.profile.user_type
-            if user_type == 'STUDENT':
-                return redirect('student-gatepass-list')
-            elif user_type == 'WARDEN':
-                return redirect('warden-dashboard')
-            elif user_type == 'SECURITY':
-                return redirect('security-dashboard')
-        except AttributeError:
-            # If user doesn't have a profile
-            return redirect('login')
+    user_type = get_principal(request).role
+    if user_type == 'STUDENT':
+        return redirect('student-gatepass-list')
+    elif user_type == 'WARDEN':
+        return redirect('warden-dashboard')
+    elif user_type == 'SECURITY':
+        return redirect('security-dashboard')
+    elif user_type == 'PARENT':
+        return redirect('parent-dashboard')
+    # Anonymous, or a user without a profile
     return redirect('login')
 
 class IsSecurity(BasePermission):
@@ -89,7 +96,7 @@ class IsSecurity(BasePermission):
     Allows access only to users with the Security role.
     """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.profile.user_type == 'SECURITY'
+        return get_principal(request).is_security
 
 class SecurityDashboardView(View):
     def get(self, request):
@@ -100,7 +107,12 @@ class SecurityDashboardView(View):
                 gatepass = Gatepass.objects.get(id=gatepass_id)
             except (Gatepass.DoesNotExist, ValueError):
                 gatepass = None
-        return render(request, 'security_dashboard.html', {'gatepass': gatepass})
+        return render(request, 'security_dashboard.html', {
+            'gatepass': gatepass,
+            'stats': get_counters(),
+            'students_out': occupancy.students_out(),
+            'latest_event_id': live.latest_id(),
+        })
 
 # ----- Security APIs -----
 class SecurityGatepassDetailAPIView(generics.RetrieveAPIView):
@@ -112,6 +124,30 @@ class SecurityGatepassDetailAPIView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated, IsSecurity]
     lookup_field = 'id' # The gatepass UUID
 
+class SecurityScanAPIView(APIView):
+    """
+    Minimal gatepass "scan card" for gate verification, served from cache.
+    """
+    permission_classes = [IsAuthenticated, IsSecurity]
+
+    def get(self, request, id):
+        card = scan.get_card(id)
+        if card is None:
+            return Response({"detail": "Gatepass not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(card)
+
+class SecurityVerifyPassAPIView(APIView):
+    """
+    Verify a signed gatepass token (from the student's QR code). Needs no database query; see passes.verify().
+    """
+    permission_classes = [IsAuthenticated, IsSecurity]
+
+    def post(self, request):
+        token = request.data.get('token')
+        if not token:
+            return Response({"detail": "Missing token."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(passes.verify(token))
+
 class SecurityLogTimeAPIView(APIView):
     """
     Log the student's exit or entry time.
@@ -119,31 +155,69 @@ class SecurityLogTimeAPIView(APIView):
     permission_classes = [IsAuthenticated, IsSecurity]
 
     def post(self, request, pk, action):
-        gatepass = get_object_or_404(Gatepass, pk=pk)
-
-        if action == 'exit' and gatepass.status == 'APPROVED' and not gatepass.actual_exit_time:
-            gatepass.actual_exit_time = timezone.now()
-            gatepass.save()
-            return Response({"detail": "Exit time logged."})
+        result = movements.apply_movements([{'gatepass_id': pk, 'action': action}], actor=request.user.username)[0]
+        if result['ok']:
+            return Response({"detail": result['detail']})
+        if result['detail'] == "Gatepass not found.":
+            return Response({"detail": result['detail']}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"detail": "Invalid action or state."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if action == 'entry' and gatepass.actual_exit_time and not gatepass.actual_entry_time:
-            gatepass.actual_entry_time = timezone.now()
-            gatepass.save()
-            return Response({"detail": "Entry time logged."})
+class SecurityLogTimeBatchAPIView(APIView):
+    """
+    Log exit/entry times for a batch of gatepasses in one request.
+    Expects {"items": [{"gatepass_id", "action", "client_timestamp"}, ...]}.
+    """
+    permission_classes = [IsAuthenticated, IsSecurity]
 
-        return Response({"detail": "Invalid action or state."}, status=status.HTTP_400_BAD_REQUEST)
+    def post(self, request):
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Expected a non-empty list of items."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > movements.MAX_BATCH_SIZE:
+            return Response({"detail": f"At most {movements.MAX_BATCH_SIZE} items per batch."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(item, dict) for item in items):
+            return Response({"detail": "Each item must be an object."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": movements.apply_movements(items, actor=request.user.username)})
 
 class IsWarden(BasePermission):
     """
     Allows access only to users with the Warden role.
     """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.profile.user_type == 'WARDEN'
+        return get_principal(request).is_warden
+
+class GatepassListMixin:
+    """
+    Keyset-paginated listing of live and archived gatepasses. GET returns the
+    compact list representation unless ?view=full asks for nested students
+    and tokens.
+    """
+    pagination_class = KeysetPagination
+
+    def wants_full_view(self):
+        return self.request.method != 'GET' or self.request.query_params.get('view') == 'full'
+
+    def get_serializer_class(self):
+        return GatepassSerializer if self.wants_full_view() else GatepassListSerializer
+
+    def get_queryset(self):
+        live, archived = archive.querysets()
+        if self.wants_full_view():
+            return [
+                GatepassSerializer.setup_eager_loading(live),
+                GatepassArchiveSerializer.setup_eager_loading(archived),
+            ]
+        return [live.select_related('student'), archived.select_related('student')]
+
+    def paginate_queryset(self, queryset):
+        rows = super().paginate_queryset(queryset)
+        if rows is not None and self.wants_full_view():
+            archive.attach_tokens(rows)
+        return rows
 
 # ----- Warden APIs -----
-class WardenGatepassListAPIView(generics.ListAPIView):
-    queryset = Gatepass.objects.select_related('student__profile__user').prefetch_related('approvals__parent').all().order_by('-created_at')
-    serializer_class = GatepassSerializer
+class WardenGatepassListAPIView(GatepassListMixin, generics.ListAPIView):
     permission_classes = [IsWarden]
     authentication_classes = [SessionAuthentication]
 
@@ -152,64 +226,117 @@ class WardenGatepassActionAPIView(APIView):
     authentication_classes = [SessionAuthentication]
 
     def post(self, request, pk, action):
-        gatepass = get_object_or_404(Gatepass, pk=pk)
-
         if action not in ["approve", "reject"]:
             return Response({"detail": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
 
-        old_status = gatepass.status
-        is_override = old_status != 'PENDING_WARDEN'
-
-        if action == "approve":
-            gatepass.status = "APPROVED"
-        elif action == "reject":
-            gatepass.status = "REJECTED"
+        new_status = "APPROVED" if action == "approve" else "REJECTED"
 
         # Log the warden's action with override flag
-        gatepass.audit.append({
-            "action": f"Warden {action}d" + (" (override)" if is_override else ""),
-            "old_status": old_status,
-            "user": request.user.username,
-            "timestamp": timezone.now().isoformat(),
-        })
-        gatepass.save()
+        def event(old_status):
+            is_override = old_status != 'PENDING_WARDEN'
+            return history.event(
+                f"Warden {action}d" + (" (override)" if is_override else ""),
+                actor=request.user.username,
+            )
+
+        try:
+            old_status = transitions.transition(pk, None, new_status, event=event)
+        except transitions.TransitionConflict as e:
+            if e.actual is None:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        is_override = old_status != 'PENDING_WARDEN'
         return Response({
             "detail": f"Gatepass {action}d successfully." + (" (Override)" if is_override else ""),
             "was_override": is_override
         })
 
+class WardenGatepassExportAPIView(APIView):
+    """
+    Stream gatepasses as CSV or NDJSON, filtered by ?from=, ?to= (YYYY-MM-DD),
+    ?status= (comma-separated) and ?student= (roll number).
+    """
+    permission_classes = [IsWarden]
+    authentication_classes = [SessionAuthentication]
+
+    def get(self, request, fmt):
+        if fmt not in exports.FORMATS:
+            return Response({"detail": "Invalid format."}, status=status.HTTP_400_BAD_REQUEST)
+        params = request.query_params
+        try:
+            querysets = exports.filter_gatepasses(
+                params.get('from'), params.get('to'), params.get('status'), params.get('student')
+            )
+        except exports.InvalidExportFilter as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(exports.export(querysets, fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="gatepasses.{fmt}"'
+        return response
+
 
 # ----- Warden Views -----
 class WardenDashboardView(View):
     def get(self, request):
         pending_gatepasses = Gatepass.objects.filter(status='PENDING_WARDEN').order_by('-created_at')
-        return render(request, 'warden_dashboard.html', {'gatepasses': pending_gatepasses})
+        return render(request, 'warden_dashboard.html', {
+            'gatepasses': pending_gatepasses,
+            'stats': get_counters(),
+            'latest_event_id': live.latest_id(),
+        })
+
+class LiveEventsView(View):
+    """
+    Server-sent gatepass events for the warden and security dashboards.
+    Streams under ASGI; under WSGI each request returns what is new and the
+    browser polls again after live.POLL_RETRY_MS.
+    """
+    async def get(self, request):
+        principal = await sync_to_async(get_principal)(request)
+        if not (principal.is_warden or principal.is_security):
+            return HttpResponseForbidden()
+
+        after_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+        try:
+            after_id = int(after_id) if after_id else await sync_to_async(live.latest_id)()
+        except ValueError:
+            return HttpResponseBadRequest("Invalid event id.")
+
+        if isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(live.stream(after_id), content_type='text/event-stream')
+        else:
+            response = HttpResponse(await sync_to_async(live.snapshot)(after_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 # ----- Student Views -----
 class StudentRequestView(View):
     def get(self, request):
-        if not hasattr(request.user, 'profile') or request.user.profile.user_type != 'STUDENT':
+        principal = get_principal(request)
+        if not principal.is_student:
             return redirect('login')
-        form = GatepassRequestForm()
-        recent_requests = Gatepass.objects.filter(student=request.user.profile.student).order_by('-created_at')[:5]
-        return render(request, 'student_request.html', {'form': form, 'recent_requests': recent_requests})
+        return self.render_form(request, principal, GatepassRequestForm())
 
     def post(self, request):
-        if not hasattr(request.user, 'profile') or request.user.profile.user_type != 'STUDENT':
+        principal = get_principal(request)
+        if not principal.is_student:
             return redirect('login')
 
         form = GatepassRequestForm(request.POST)
-        recent_requests = Gatepass.objects.filter(student=request.user.profile.student).order_by('-created_at')[:5]
-
         if form.is_valid():
             try:
-                gatepass = form.save(commit=False)
-                gatepass.student = request.user.profile.student
-                gatepass.status = 'PENDING_PARENT'
-                gatepass.save()
-
-                # Send approval email to parents
-                gatepass.send_approval_email()
+                with transaction.atomic():
+                    gatepass = form.save(commit=False)
+                    gatepass.student_id = principal.student_id
+                    gatepass.status = 'PENDING_PARENT'
+                    gatepass.save()
+
+                    # Queue approval emails to parents; they go out after commit
+                    gatepass.send_approval_email()
                 messages.success(request, "Gatepass request submitted successfully. Your parents will be notified.")
                 return redirect('student-gatepass-list')
             except Exception as e:
@@ -217,33 +344,70 @@ class StudentRequestView(View):
         else:
             messages.error(request, "Please correct the errors below.")
 
-        return render(request, 'student_request.html', {'form': form, 'recent_requests': recent_requests})
+        return self.render_form(request, principal, form)
+
+    def render_form(self, request, principal, form):
+        # The recent requests fragment is cached per student; the queryset only runs on a miss
+        return render(request, 'student_request.html', {
+            'form': form,
+            'student_id': principal.student_id,
+            'recent_requests': recent.recent_requests(principal.student_id),
+            'recent_requests_ttl': recent.CACHE_TTL,
+        })
 
 class StudentGatepassListView(View):
+    page_size = 20
+
     def get(self, request):
-        student = request.user.profile.student
-        gatepasses = Gatepass.objects.filter(student=student).order_by('-created_at')
-        return render(request, 'student_gatepass_list.html', {'gatepasses': gatepasses})
+        principal = get_principal(request)
+        if not principal.is_student:
+            return redirect('login')
+        cursor = request.GET.get('cursor')
+        try:
+            # Served from the (student, created_at) indexes of the live and
+            # archived tables, one page at a time
+            gatepasses, next_cursor = archive.page(cursor, self.page_size, student_id=principal.student_id)
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        for gatepass in gatepasses:
+            if gatepass.status == 'APPROVED' and not gatepass.actual_entry_time and not gatepass.is_archived:
+                gatepass.signed_pass = passes.issue(gatepass)
+        return render(request, 'student_gatepass_list.html', {
+            'gatepasses': gatepasses,
+            'next_cursor': next_cursor,
+            'is_first_page': not cursor,
+        })
 
 # ----- Gatepass APIs -----
-class GatepassListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Gatepass.objects.all()
-    serializer_class = GatepassSerializer
+class GatepassListCreateAPIView(GatepassListMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated] # Ensure only logged-in users can create
 
     def perform_create(self, serializer):
         # Automatically associate the gatepass with the logged-in student
-        if not hasattr(self.request.user, 'profile') or self.request.user.profile.user_type != 'STUDENT':
+        principal = get_principal(self.request)
+        if not principal.is_student:
             raise serializers.ValidationError("Only students can create gatepass requests")
-            
-        gatepass = serializer.save(student=self.request.user.profile.student)
-        
-        try:
-            # Send approval emails
+
+        with transaction.atomic():
+            gatepass = serializer.save(student_id=principal.student_id)
+            # Queue approval emails; they are dispatched after commit
             gatepass.send_approval_email()
-        except Exception as e:
-            # Log the error but don't fail the request
-            print(f"Error sending approval emails: {str(e)}")
+
+class GatepassHistoryAPIView(APIView):
+    """
+    Stream a gatepass's event history as newline-delimited JSON, oldest first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        principal = get_principal(request)
+        found = archive.locate(pk)
+        if found is None:
+            return Response({"detail": "Gatepass not found."}, status=status.HTTP_404_NOT_FOUND)
+        owner, archived = found
+        if not (principal.is_warden or principal.is_security or principal.student_id == owner):
+            return Response({"detail": "Not allowed."}, status=status.HTTP_403_FORBIDDEN)
+        return StreamingHttpResponse(archive.history_ndjson(pk, archived), content_type='application/x-ndjson')
 
 # ----- Approval APIs -----
 class ApprovalActionAPIView(APIView):
@@ -251,46 +415,47 @@ class ApprovalActionAPIView(APIView):
     Parent approves or rejects using token in URL
     """
     def get(self, request, token, action):
+        # Token, gatepass state and parent name in one read
+        approval_token = get_object_or_404(
+            ApprovalToken.objects.select_related('gatepass', 'parent').only(
+                'token', 'expires_at', 'used', 'gatepass__status', 'gatepass__version', 'parent__name',
+            ),
+            token=token,
+        )
+
+        if not approval_token.is_valid:
+            return Response({"detail": "This approval link has expired or already been used."},
+                         status=status.HTTP_400_BAD_REQUEST)
+
+        if action not in ['approve', 'reject']:
+            return Response({"detail": "Invalid action."},
+                         status=status.HTTP_400_BAD_REQUEST)
+
+        gatepass = approval_token.gatepass
+        if gatepass.status != 'PENDING_PARENT':
+            return Response({"detail": "This request is no longer pending parent approval."},
+                         status=status.HTTP_409_CONFLICT)
+
+        # Just one parent approval is enough - move to warden
+        new_status = "REJECTED" if action == 'reject' else "PENDING_WARDEN"
         try:
-            approval_token = get_object_or_404(ApprovalToken, token=token)
-            
-            if not approval_token.is_valid:
-                return Response({"detail": "This approval link has expired or already been used."}, 
-                             status=status.HTTP_400_BAD_REQUEST)
-            
-            if action not in ['approve', 'reject']:
-                return Response({"detail": "Invalid action."}, 
-                             status=status.HTTP_400_BAD_REQUEST)
-                
-            # Use the token
-            success = approval_token.use_token(action)
-            if not success:
-                return Response({"detail": "Could not process approval action."}, 
-                             status=status.HTTP_400_BAD_REQUEST)
-
-            # Update gatepass status
-            gatepass = approval_token.gatepass
-            if action == 'reject':
-                gatepass.status = "REJECTED"
-            else:
-                # Just one parent approval is enough - move to warden
-                gatepass.status = "PENDING_WARDEN"
-                    
-            gatepass.save()
-            
-            # Record the action in audit log
-            gatepass.audit.append({
-                "action": f"Parent {action}d",
-                "parent": approval_token.parent.name,
-                "timestamp": timezone.now().isoformat(),
-            })
-            gatepass.save()
-
-            return Response({
-                "detail": f"Gatepass request {action}ed successfully.",
-                "status": gatepass.status
-            })
-        except ApprovalToken.DoesNotExist:
-            return Response({"detail": "Invalid approval token."}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            with transaction.atomic():
+                if not approval_token.use_token(action):
+                    return Response({"detail": "Could not process approval action."},
+                                 status=status.HTTP_400_BAD_REQUEST)
+                # Marks the sibling parents' tokens used in the same transaction
+                transitions.transition(
+                    gatepass.pk,
+                    ['PENDING_PARENT'],
+                    new_status,
+                    event=history.event(f"Parent {action}d", actor=approval_token.parent.name),
+                    current=(gatepass.status, gatepass.version),
+                )
+        except transitions.TransitionConflict:
+            return Response({"detail": "This request is no longer pending parent approval."},
+                         status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "detail": f"Gatepass request {action}ed successfully.",
+            "status": new_status
+        })